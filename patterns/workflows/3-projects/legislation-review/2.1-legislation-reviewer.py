@@ -5,6 +5,8 @@ import os
 import logging
 import dotenv
 
+from model_profiles import get_profile
+
 try:
     import tiktoken
 except ImportError:
@@ -227,7 +229,7 @@ if __name__ == "__main__":
     orchestrator = LegislationOrchestrator()
     legislation_text = ""
 
-    """Get approximately the first 50k tokens worth of content from legislation document"""
+    """Get as much of the legislation document as one request can carry"""
 
     # Load the document
     with open(
@@ -239,9 +241,11 @@ if __name__ == "__main__":
     # Use tiktoken to count tokens (assuming OpenAI GPT-4 encoding)
     enc = tiktoken.encoding_for_model("gpt-4o")
     tokens = enc.encode(full_text)
-    max_tokens = 4000
+    # As much of the bill as fits next to the prompt, leaving the response room
+    # in the context window and the token budget, per the model's profile
+    max_tokens = get_profile(model).input_tokens(len(enc.encode(ORCHESTRATOR_PROMPT)))
 
-    # Truncate to the first 50k tokens and decode back to string
+    # Truncate to that many tokens and decode back to string
     truncated_text = enc.decode(tokens[:max_tokens])
     legislation_text = truncated_text
     legislation_object = {}
@@ -1,10 +1,14 @@
 from typing import List, Dict
 from pydantic import BaseModel, Field
 from openai import OpenAI
+import argparse
 import os
 import logging
 import dotenv
 
+from llm_health import check_model, warm_up
+from model_profiles import get_profile
+
 try:
     import tiktoken
 except ImportError:
@@ -181,18 +185,6 @@ def validate_legislation(legislation_text: str) -> bool:
     return is_valid
 
 
-def check_llm_availability() -> bool:
-    """Check if the local LLM is available and responding."""
-    try:
-        response = client.chat.completions.create(
-            model=model, messages=[{"role": "user", "content": "test"}], max_tokens=1
-        )
-        return True
-    except Exception as e:
-        logger.error(f"Local LLM not available: {e}")
-        return False
-
-
 # -----------------------------------------------------------
 # Step 2: Define prompts
 # -----------------------------------------------------------
@@ -239,11 +231,26 @@ class LegislationOrchestrator:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analyze legislation with a local LLM."
+    )
+    parser.add_argument(
+        "--no-warm-up",
+        action="store_true",
+        help="Don't load the model with a tiny request while the document is prepared",
+    )
+    args = parser.parse_args()
+
     print("Legislation Reviewer Workflow Example")
 
-    if not check_llm_availability():
+    # Listing the models doesn't load one, unlike a completion. The probe also
+    # leaves a keep-alive connection open for the requests that follow.
+    if not check_model(client, model):
         logger.error("Local LLM is not available. Exiting.")
         exit(1)
+    if not args.no_warm_up:
+        # The model loads while the document is read and tokenized
+        warm_up(client, model)
 
     orchestrator = LegislationOrchestrator()
     legislation_text = ""
@@ -262,7 +269,8 @@ if __name__ == "__main__":
         # Try to use tiktoken if available
         enc = tiktoken.encoding_for_model("gpt-4")
         tokens = enc.encode(full_text)
-        max_tokens = 7500
+        # As much of the bill as fits next to the prompt, per the model's profile
+        max_tokens = get_profile(model).input_tokens(len(enc.encode(ORCHESTRATOR_PROMPT)))
         truncated_text = enc.decode(tokens[:max_tokens])
     except Exception as e:
         logger.warning(
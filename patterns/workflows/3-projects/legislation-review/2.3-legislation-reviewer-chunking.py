@@ -1,17 +1,49 @@
-from typing import List, Dict, Iterator
-from pydantic import BaseModel, Field
-from openai import OpenAI
+from typing import (
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Union,
+)
+from pydantic import BaseModel, Field, create_model
+from openai import AsyncOpenAI, OpenAI
 import os
 import logging
 import dotenv
 
+import argparse
+import asyncio
+import hashlib
+import heapq
+import json
+import mmap
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from pathlib import Path
+
 import tiktoken
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from tqdm import tqdm
 
+from analysis_store import AnalysisCache, ChunkResultSink, RunManifest
+from client_pool import Backend, BackendRouter, ClientPool
+from llm_health import warm_connections, warm_connections_async, warm_up
+from llm_metrics import metrics
+from model_profiles import get_profile
+from rate_limiter import ConcurrencyController, RateLimiter
+from section_stream import SectionStream, StreamedAnalysis, json_schema_format, sections_first
+
+import threading
 import time
-from datetime import datetime, timedelta
-from collections import deque
+from collections import Counter
+from contextlib import contextmanager
 
 
 # Environment variables
@@ -28,70 +60,41 @@ logger = logging.getLogger(__name__)
 
 # Local LLM Setup
 client = OpenAI(base_url="http://127.0.0.1:1234/v1", api_key="not-needed")
+async_client = AsyncOpenAI(base_url="http://127.0.0.1:1234/v1", api_key="not-needed")
 model = "gemma-3-4b-it-qat"
 
 # OpenAI client setup
 # client = OpenAI(api_key=api_key)
+# async_client = AsyncOpenAI(api_key=api_key)
 # model = "gpt-4o"
 
+# Where the models of the legislation reviewers are served, for routing chunks
+# between them with --backend
+BACKEND_URLS = {
+    "gemma-3-4b-it-qat": "http://127.0.0.1:1234/v1",
+    "deepseek-r1-distill-llama-8b": "http://192.168.0.69:1234/v1",
+    "gpt-4o": "https://api.openai.com/v1",
+}
+
 # Constants
+# Context window, output budget, rate limits and throughput of the model
+profile = get_profile(model)
 # Maximum context length for the model
-MAX_CONTEXT_LENGTH = 8000
+MAX_CONTEXT_LENGTH = profile.context_window
+REQUESTS_PER_MINUTE = profile.requests_per_minute
+TOKENS_PER_MINUTE = profile.tokens_per_minute
+# How far above the profile's concurrency --adaptive-concurrency may climb
+ADAPTIVE_HEADROOM = 4
+# Room left in the context window for each tree-reduce response
+REDUCE_OUTPUT_TOKENS = 1024
+# Rough size of a token of JSON output, for cutting off runaway streams
+CHARS_PER_TOKEN = 4
 
 # -----------------------------------------------------------
 # Step 0: Define the rate limiter
 # -----------------------------------------------------------
-"""Rate limiter to control the number of requests to the OpenAI API."""
-
-
-class RateLimiter:
-    """Handles rate limiting for API requests."""
-
-    def __init__(self, requests_per_minute: int = 50, max_retries: int = 5):
-        self.requests_per_minute = requests_per_minute
-        self.max_retries = max_retries
-        self.request_timestamps = deque(maxlen=requests_per_minute)
-        self.retry_intervals = [2, 4, 8, 16, 32]  # exponential backoff in seconds
-
-    def wait_if_needed(self):
-        """Check if we need to wait before making another request."""
-        now = datetime.now()
-
-        # Remove timestamps older than 1 minute
-        while self.request_timestamps and self.request_timestamps[0] < now - timedelta(
-            minutes=1
-        ):
-            self.request_timestamps.popleft()
-
-        # If we've hit the rate limit, wait until we can make another request
-        if len(self.request_timestamps) >= self.requests_per_minute:
-            wait_time = (
-                self.request_timestamps[0] + timedelta(minutes=1) - now
-            ).total_seconds()
-            if wait_time > 0:
-                logger.info(f"Rate limit reached. Waiting {wait_time:.2f} seconds...")
-                time.sleep(wait_time)
-
-    def make_request_with_retry(self, request_func, *args, **kwargs):
-        """Make a request with retry logic and rate limiting."""
-        for retry in range(self.max_retries):
-            try:
-                self.wait_if_needed()
-                result = request_func(*args, **kwargs)
-                self.request_timestamps.append(datetime.now())
-                return result
-            except Exception as e:
-                if "429" in str(e) or "RateLimitError" in str(e):
-                    wait_time = self.retry_intervals[
-                        min(retry, len(self.retry_intervals) - 1)
-                    ]
-                    logger.warning(
-                        f"Rate limit exceeded. Retrying in {wait_time} seconds... (Attempt {retry + 1}/{self.max_retries})"
-                    )
-                    time.sleep(wait_time)
-                    continue
-                raise
-        raise Exception(f"Failed after {self.max_retries} retries")
+"""The rate limiter, its adaptive concurrency controller and the run's metrics
+live in rate_limiter.py and llm_metrics.py, and are imported above."""
 
 
 # -----------------------------------------------------------
@@ -185,6 +188,69 @@ class Legislation(BaseModel):
     )
 
 
+def empty_legislation(sections: List[LegislationSection] = None) -> Legislation:
+    """An analysis with every field blank, holding just `sections` if given."""
+    return Legislation(
+        short_title="",
+        table_of_contents="",
+        findings_or_purpose="",
+        definitions=[],
+        amendments=[],
+        authorization_of_appropriations="",
+        effective_date="",
+        sections=list(sections or []),
+    )
+
+
+def legislation_part(name: str, doc: str, fields: List[str]) -> type[BaseModel]:
+    """A model of some of Legislation's fields, with their types and descriptions."""
+    return create_model(
+        name,
+        __doc__=doc,
+        **{
+            field: (Legislation.model_fields[field].annotation, Legislation.model_fields[field])
+            for field in fields
+        },
+    )
+
+
+LegislationOverview = legislation_part(
+    "LegislationOverview",
+    "The document-level fields of a legislation analysis.",
+    [
+        "short_title",
+        "table_of_contents",
+        "findings_or_purpose",
+        "authorization_of_appropriations",
+        "effective_date",
+    ],
+)
+
+LegislationSections = legislation_part(
+    "LegislationSections",
+    "The sections of a legislation analysis, extracted on their own.",
+    ["sections"],
+)
+
+LegislationProvisions = legislation_part(
+    "LegislationProvisions",
+    "The document-level fields, definitions and amendments of a legislation analysis.",
+    [*LegislationOverview.model_fields, "definitions", "amendments"],
+)
+
+# Split extraction asks for each of these parts in a request of its own
+EXTRACTION_PARTS = [LegislationSections, LegislationProvisions, LegislationLegalese]
+
+
+def assemble_legislation(
+    sections: LegislationSections,
+    provisions: LegislationProvisions,
+    legalese: LegislationLegalese,
+) -> Legislation:
+    """Put the parts of a split extraction back together into one analysis."""
+    return Legislation(**dict(provisions), sections=sections.sections, legalese=legalese)
+
+
 class LegislationValidation(BaseModel):
     """Validation results for the legislation analysis."""
 
@@ -196,99 +262,588 @@ class LegislationValidation(BaseModel):
     )
 
 
+class TextChunk(NamedTuple):
+    """A chunk of text with its starting token index and token count."""
+
+    text: str
+    position: int
+    token_count: Optional[int] = None
+
+
+class TokenCache:
+    """Persistent, memory-mapped store of token ids and character offsets.
+
+    Each document is stored once per encoding, keyed by the SHA-256 of its
+    content, as a header followed by interleaved uint32 (token id, character
+    offset) pairs. On a cache hit the file is memory-mapped, so repeat runs
+    over the same corpus skip tokenization entirely.
+    """
+
+    MAGIC = b"TOKCACHE"
+    HEADER = struct.Struct("<8sQQ")  # magic, token count, character count
+
+    def __init__(self, cache_dir: str = ".token_cache"):
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def content_hash(source: Union[str, TextIO]) -> Optional[str]:
+        """Hash a string, or the file behind a seekable file object."""
+        digest = hashlib.sha256()
+        if isinstance(source, str):
+            digest.update(source.encode("utf-8"))
+            return digest.hexdigest()
+
+        if not getattr(source, "name", None) or not source.seekable():
+            return None  # Can't hash a stream without consuming it
+        position = source.tell()
+        with open(source.name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        source.seek(position)
+        return digest.hexdigest()
+
+    def path_for(self, digest: str, encoding_name: str) -> Path:
+        return self.cache_dir / f"{digest}-{encoding_name}.tok"
+
+    def load(self, path: Path) -> Optional[tuple[memoryview, memoryview, int]]:
+        """Memory-map a cached file, returning (tokens, offsets, char count)."""
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, token_count, char_count = self.HEADER.unpack_from(mapped)
+        if magic != self.MAGIC or len(mapped) != self.HEADER.size + token_count * 8:
+            logger.warning(f"Ignoring corrupt token cache file {path}")
+            mapped.close()
+            return None
+
+        # The memoryviews keep the mapping alive for as long as they are used
+        pairs = memoryview(mapped)[self.HEADER.size :].cast("I")
+        return pairs[0::2], pairs[1::2], char_count
+
+    def writer(self, path: Path) -> "TokenCacheWriter":
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return TokenCacheWriter(path)
+
+
+class TokenCacheWriter:
+    """Appends token windows to a temporary cache file and publishes it atomically."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_suffix(".tmp")
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(b"\0" * TokenCache.HEADER.size)
+        self.token_count = 0
+
+    def append(self, tokens: List[int], offsets: List[int]):
+        pairs = array("I", [0]) * (2 * len(tokens))
+        pairs[0::2] = array("I", tokens)
+        pairs[1::2] = array("I", offsets)
+        pairs.tofile(self.file)
+        self.token_count += len(tokens)
+
+    def commit(self, char_count: int):
+        self.file.seek(0)
+        self.file.write(
+            TokenCache.HEADER.pack(TokenCache.MAGIC, self.token_count, char_count)
+        )
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        logger.info(f"Saved {self.token_count} tokens to cache {self.path}")
+
+    def discard(self):
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
 class TextChunker:
     """Handles chunking of large text documents into manageable pieces."""
 
-    def __init__(self, chunk_size: int = None, overlap: int = 200):
+    def __init__(
+        self,
+        chunk_size: int = None,
+        overlap: int = 200,
+        window_size: int = 65536,
+        cache_dir: str = None,
+    ):
         self.chunk_size = chunk_size or (
             MAX_CONTEXT_LENGTH // 2
         )  # Default to half the context length
-        if self.chunk_size > MAX_CONTEXT_LENGTH:
+        if self.chunk_size > profile.input_tokens():
             logger.warning(
                 f"Chunk size {self.chunk_size} exceeds maximum context length. Adjusting..."
             )
-            self.chunk_size = MAX_CONTEXT_LENGTH - 1000  # Leave room for system prompt
+            # Leave room for the response and the system prompt
+            self.chunk_size = profile.input_tokens(1000)
         self.overlap = min(
             overlap, self.chunk_size // 4
         )  # Ensure overlap isn't too large
+        self.window_size = window_size  # Characters tokenized per streaming window
         self.encoding = tiktoken.encoding_for_model("gpt-4o")
+        self.token_cache = TokenCache(cache_dir) if cache_dir else None
+        self._byte_lengths = None
+
+    @staticmethod
+    def _safe_cut(text: str) -> int:
+        """Find the last ' word' boundary, where no token can straddle the cut."""
+        cut = text.rfind(" ")
+        while cut > 0:
+            if (
+                not text[cut - 1].isspace()
+                and cut + 1 < len(text)
+                and text[cut + 1].isalpha()
+            ):
+                return cut
+            cut = text.rfind(" ", 0, cut)
+        return -1
+
+    def _iter_windows(self, source: Union[str, TextIO]) -> Iterator[str]:
+        """Yield bounded windows of the source text that can be tokenized independently."""
+        if isinstance(source, str):
+            blocks = (
+                source[i : i + self.window_size]
+                for i in range(0, len(source), self.window_size)
+            )
+        else:
+            blocks = iter(lambda: source.read(self.window_size), "")
+
+        pending = ""
+        for block in blocks:
+            pending += block
+            cut = self._safe_cut(pending)
+            if cut == -1 and len(pending) < 4 * self.window_size:
+                continue  # No safe boundary yet, keep reading
+            if cut == -1:
+                cut = len(pending)
+            yield pending[:cut]
+            pending = pending[cut:]
+        if pending:
+            yield pending
+
+    def _token_byte_lengths(self) -> List[int]:
+        """Build (once) a table of the byte length of every token id."""
+        if self._byte_lengths is None:
+            lengths = []
+            for token in range(self.encoding.n_vocab):
+                try:
+                    lengths.append(len(self.encoding.decode_single_token_bytes(token)))
+                except KeyError:
+                    lengths.append(0)  # Unused id
+            self._byte_lengths = lengths
+        return self._byte_lengths
+
+    def _token_offsets(self, window: str, tokens: List[int], position: int) -> List[int]:
+        """Return the character offset at which each token starts."""
+        if window.isascii():
+            # One character per byte, so offsets are running byte lengths
+            lengths = map(self._token_byte_lengths().__getitem__, tokens)
+            return list(accumulate(lengths, initial=position))[:-1]
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        return [position + offset for offset in offsets]
+
+    def _iter_token_windows(
+        self, source: Union[str, TextIO], use_cache: bool = True
+    ) -> Iterator[tuple[str, List[int]]]:
+        """Yield each text window with the character offsets of its tokens.
+
+        Offsets come from the token cache when possible; otherwise every
+        window is encoded exactly once.
+        """
+        digest = None
+        if self.token_cache and use_cache:
+            digest = self.token_cache.content_hash(source)
+        if digest is None:
+            position = 0
+            for window in self._iter_windows(source):
+                window_tokens = self.encoding.encode(window)
+                yield window, self._token_offsets(window, window_tokens, position)
+                position += len(window)
+            return
+
+        path = self.token_cache.path_for(digest, self.encoding.name)
+        cached = self.token_cache.load(path)
+        if cached is not None:
+            logger.info(f"Using cached tokens from {path}")
+            _, offsets, _ = cached
+            # Windows are cut where tokenization is stable, so every window
+            # maps onto a contiguous run of cached tokens
+            position = start = 0
+            for window in self._iter_windows(source):
+                position += len(window)
+                end = bisect_left(offsets, position, start)
+                yield window, offsets[start:end].tolist()
+                start = end
+            return
 
-    def create_chunks(self, text: str) -> Iterator[tuple[str, int]]:
-        """Split text into overlapping chunks, returning chunks with their position."""
-        tokens = self.encoding.encode(text)
+        writer = self.token_cache.writer(path)
+        try:
+            position = 0
+            for window in self._iter_windows(source):
+                window_tokens = self.encoding.encode(window)
+                window_offsets = self._token_offsets(window, window_tokens, position)
+                writer.append(window_tokens, window_offsets)
+                yield window, window_offsets
+                position += len(window)
+        except BaseException:
+            writer.discard()
+            raise
+        writer.commit(position)
+
+    def _cut_chunk(
+        self, text: str, text_start: int, offsets: List[int]
+    ) -> tuple[str, int]:
+        """Cut the next chunk off the buffer, trimmed back to its last sentence break.
+
+        The chunk text and its token count both come from the token offset
+        map, so nothing is decoded or re-encoded.
+        """
+        token_count = min(self.chunk_size, len(offsets))
+        char_start = offsets[0]
+        if token_count < len(offsets):
+            char_end = offsets[token_count]
+        else:
+            char_end = text_start + len(text)
+        chunk_text = text[char_start - text_start : char_end - text_start]
+
+        # Find a good breaking point
+        if len(chunk_text) > 100:
+            # Only break in the back half, otherwise the next chunk would
+            # barely advance past the overlap
+            last_period = chunk_text.rfind(". ", len(chunk_text) // 2)
+            if last_period != -1:
+                chunk_text = chunk_text[: last_period + 1]
+                token_count = bisect_left(
+                    offsets, char_start + last_period + 1, 0, token_count
+                )
+        return chunk_text, token_count
+
+    def create_chunks(
+        self, text: Union[str, TextIO], use_cache: bool = True
+    ) -> Iterator[TextChunk]:
+        """Split text into overlapping chunks, returning chunks with their position.
+
+        The text (a string or an open file) is tokenized in bounded windows, so
+        the first chunk is yielded as soon as enough tokens are buffered and
+        memory stays flat regardless of document size.
+        """
+        offsets: List[int] = []  # Character offset of each buffered token
+        buffer_start = 0  # Token index of offsets[0] in the whole text
+        text_buffer = ""
+        text_start = 0  # Character offset of text_buffer[0] in the whole text
+        emitted_end = 0  # Token index up to which text has been yielded
+        total_tokens = 0
+
+        def advance_buffer(token_count: int):
+            nonlocal offsets, buffer_start, text_buffer, text_start
+            # Keep the overlap in the buffer for the next chunk
+            advance = max(token_count - self.overlap, 1)
+            del offsets[:advance]
+            buffer_start += advance
+            next_start = offsets[0] if offsets else text_start + len(text_buffer)
+            text_buffer = text_buffer[next_start - text_start :]
+            text_start = next_start
 
-        logger.info(f"Total tokens in text: {len(tokens)}")
-        if len(tokens) < self.chunk_size:
+        logger.info("Creating text chunks...")
+        for window, window_offsets in self._iter_token_windows(text, use_cache):
+            total_tokens += len(window_offsets)
+            offsets.extend(window_offsets)
+            text_buffer += window
+
+            while len(offsets) >= self.chunk_size:
+                chunk_text, token_count = self._cut_chunk(
+                    text_buffer, text_start, offsets
+                )
+                logger.info(f"Created chunk with {token_count} tokens")
+                yield TextChunk(chunk_text, buffer_start, token_count)
+                emitted_end = buffer_start + token_count
+                advance_buffer(token_count)
+                logger.info(f"Next chunk will start at token index {buffer_start}...")
+
+        logger.info(f"Total tokens in text: {total_tokens}")
+        if emitted_end == 0:
             logger.info("Text fits in single chunk")
-            yield text, 0
+            yield TextChunk(text_buffer, 0, total_tokens)
             return
 
-        start = 0
-        logger.info("Creating text chunks...")
-        while start < len(tokens):
-            # Calculate end position
-            end = start + min(self.chunk_size, len(tokens) - start)
-            chunk_tokens = tokens[start:end]
-            chunk_text = self.encoding.decode(chunk_tokens)
-
-            # Find a good breaking point
-            if len(chunk_text) > 100:
-                last_period = chunk_text.rfind(". ")
-                if last_period != -1:
-                    chunk_text = chunk_text[: last_period + 1]
-                    # Recalculate tokens for accurate positioning
-                    chunk_tokens = self.encoding.encode(chunk_text)
-
-            logger.info(f"Created chunk with {len(chunk_tokens)} tokens")
-            yield chunk_text, start
-
-            # Update start position
-            next_start = start + len(chunk_tokens) - self.overlap
-            if next_start <= start:
-                next_start = start + 1
-            start = next_start
-            logger.info(f"Next chunk will start at token index {start}...")
+        # Whatever is left after the last full chunk fits in one more chunk, and
+        # nothing follows it, so it isn't trimmed back to a sentence break
+        if buffer_start + len(offsets) > emitted_end:
+            logger.info(f"Created chunk with {len(offsets)} tokens")
+            yield TextChunk(text_buffer, buffer_start, len(offsets))
         logger.info("Finished creating text chunks.")
 
 
+class LegislationSegmenter:
+    """Packs whole statutory sections into chunks instead of cutting at fixed token counts."""
+
+    # TITLE/Subtitle/Part/Chapter dividers and SEC. headings, at the start of a line.
+    # Quoted amendment text starts with ``, so it never matches.
+    HEADING_PATTERN = re.compile(
+        r"^[ \t]*(?:(?P<section>SEC(?:TION)?\. \d+[A-Za-z]*\.)"
+        r"|(?P<division>(?:TITLE|Subtitle|PART|Part|CHAPTER|Chapter) [IVXLC\dA-Z]+--))",
+        re.MULTILINE,
+    )
+
+    def __init__(self, chunker: TextChunker, anchor_every: int = 8):
+        self.chunker = chunker  # Supplies the encoding, token cache and budget
+        # On average one heading in anchor_every always starts a new chunk. The
+        # choice depends only on the heading text, so an edit can only move
+        # chunk boundaries up to the next anchor, not through the rest of the bill.
+        self.anchor_every = anchor_every
+
+    def _is_anchor(self, unit: TextChunk) -> bool:
+        if not self.anchor_every:
+            return False
+        heading = unit.text.strip().split("\n", 1)[0].encode("utf-8")
+        digest = hashlib.sha256(heading).digest()
+        return int.from_bytes(digest[:4], "big") % self.anchor_every == 0
+
+    def _iter_units(self, source: Union[str, TextIO]) -> Iterator[tuple[str, TextChunk]]:
+        """Index headings in one linear pass, yielding the text from each heading to the next.
+
+        Yields (kind, unit) where kind is "preamble", "division" or "section".
+        """
+        text_buffer = ""  # Always starts at the current unit
+        text_start = 0  # Character offset of text_buffer[0]
+        offsets: List[int] = []  # Character offset of each buffered token
+        buffer_start = 0  # Token index of offsets[0]
+        kind = "preamble"
+
+        def cut_unit(end: int) -> TextChunk:
+            nonlocal text_buffer, text_start, offsets, buffer_start
+            token_count = bisect_left(offsets, text_start + end)
+            unit = TextChunk(text_buffer[:end], buffer_start, token_count)
+            text_buffer = text_buffer[end:]
+            text_start += end
+            del offsets[:token_count]
+            buffer_start += token_count
+            return unit
+
+        for window, window_offsets in self.chunker._iter_token_windows(source):
+            scan_from = len(text_buffer)
+            text_buffer += window
+            offsets.extend(window_offsets)
+
+            # Only scan complete lines, a heading may continue in the next window
+            scan_end = text_buffer.rfind("\n")
+            if scan_end == -1:
+                continue
+            # Back up to the start of the line the previous scan stopped on
+            scan_from = max(text_buffer.rfind("\n", 0, scan_from), 0)
+            headings = [
+                match
+                for match in self.HEADING_PATTERN.finditer(text_buffer, scan_from, scan_end)
+                if match.start() > 0
+            ]
+            consumed = 0
+            for match in headings:
+                unit = cut_unit(match.start() - consumed)
+                consumed = match.start()
+                if unit.text:
+                    yield kind, unit
+                kind = "section" if match.group("section") else "division"
+
+        unit = cut_unit(len(text_buffer))
+        if unit.text:
+            yield kind, unit
+
+    def create_chunks(self, text: Union[str, TextIO]) -> Iterator[TextChunk]:
+        """Pack consecutive sections into chunks of up to the chunker's token budget.
+
+        Chunks never overlap and only break at headings, preferring TITLE and
+        Subtitle dividers and always breaking at anchor headings. A section
+        larger than the budget on its own falls back to the chunker's token
+        windows.
+        """
+        budget = self.chunker.chunk_size
+        parts: List[str] = []
+        start = count = 0
+
+        logger.info("Segmenting legislation by section headings...")
+        for kind, unit in self._iter_units(text):
+            if parts and self._is_anchor(unit):
+                logger.info(f"Created chunk with {count} tokens")
+                yield TextChunk("".join(parts), start, count)
+                parts = []
+
+            if unit.token_count > budget:
+                # Split the oversized section together with any headings and
+                # short sections still pending in front of it
+                if parts:
+                    unit = TextChunk("".join(parts) + unit.text, start)
+                    parts = []
+                logger.info(
+                    f"Section at token index {unit.position} exceeds the chunk size, splitting it"
+                )
+                for piece in self.chunker.create_chunks(unit.text, use_cache=False):
+                    yield TextChunk(
+                        piece.text, unit.position + piece.position, piece.token_count
+                    )
+                continue
+
+            if parts and (
+                count + unit.token_count > budget
+                or (kind == "division" and count >= budget // 2)
+            ):
+                logger.info(f"Created chunk with {count} tokens")
+                yield TextChunk("".join(parts), start, count)
+                parts = []
+
+            if not parts:
+                start, count = unit.position, 0
+            parts.append(unit.text)
+            count += unit.token_count
+
+        if parts:
+            logger.info(f"Created chunk with {count} tokens")
+            yield TextChunk("".join(parts), start, count)
+        logger.info("Finished segmenting legislation.")
+
+
 # -----------------------------------------------------------
 # Step 2: Define the parallel validation tasks
 # -----------------------------------------------------------
 
 
+# Patterns common in U.S. bill text and rare elsewhere, with their weight in
+# the local legislation score
+LEGISLATION_MARKERS = [
+    (re.compile(r"\bSEC(?:TION)?\.\s+\d+", re.IGNORECASE), 1.0),
+    (re.compile(r"\bis (?:hereby )?amended\b"), 1.0),
+    (re.compile(r"\bU\.S\.C\."), 1.0),
+    (re.compile(r"\bstriking\b.{0,80}\binserting\b"), 1.0),
+    (re.compile(r"\bof (?:title|section|chapter) [\dIVX]+\b"), 1.0),
+    (re.compile(r"\bH\. ?R\. \d+|\bS\. \d+\b|\bPublic Law \d+-\d+"), 1.0),
+    # Paragraph numbering is common in contracts and regulations too
+    (re.compile(r"\(\d+\)|\([a-z]\)\s"), 0.25),
+]
+ENACTING_CLAUSE = re.compile(
+    r"Be it enacted by the Senate and House of Representatives", re.IGNORECASE
+)
+MARKER_DENSITY_SATURATION = 20  # Weighted markers per 1000 words that score 1.0
+LOCAL_ACCEPT_SCORE = 0.5
+LOCAL_REJECT_SCORE = 0.1
+MIN_SCORED_WORDS = 50  # Shorter texts always go to the model
+
+# Validation decisions and model round-trip time, for reporting
+validation_stats = Counter()
+validation_rate_limiter = RateLimiter(requests_per_minute=REQUESTS_PER_MINUTE)
+
+
+def score_legislation(legislation_text: str) -> Optional[float]:
+    """Score from 0 to 1 how much the text looks like a U.S. bill.
+
+    Returns None for texts too short to score.
+    """
+    words = len(legislation_text.split())
+    if words < MIN_SCORED_WORDS:
+        return None
+    if ENACTING_CLAUSE.search(legislation_text):
+        return 1.0
+    markers = sum(
+        weight * len(pattern.findall(legislation_text))
+        for pattern, weight in LEGISLATION_MARKERS
+    )
+    return min(markers * 1000 / words / MARKER_DENSITY_SATURATION, 1.0)
+
+
+def _validation_request(legislation_text: str) -> Dict:
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": "Determine if this text is structured like U.S. legislation.",
+            },
+            {
+                "role": "user",
+                "content": legislation_text,
+            },
+        ],
+        "response_format": LegislationValidation,
+    }
+
+
 def validate_legislation_content(
-    legislation_text: str,
+    legislation_text: str, rate_limiter: RateLimiter = None
 ) -> LegislationValidation:
     """Validate if the input text is structured like legislation."""
-    rate_limiter = RateLimiter(requests_per_minute=50)
-
+    rate_limiter = rate_limiter or validation_rate_limiter
     return (
         rate_limiter.make_request_with_retry(
             client.beta.chat.completions.parse,
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Determine if this text is structured like U.S. legislation.",
-                },
-                {
-                    "role": "user",
-                    "content": legislation_text,
-                },
-            ],
-            response_format=LegislationValidation,
+            **_validation_request(legislation_text),
         )
         .choices[0]
         .message.parsed
     )
 
 
-def validate_legislation(legislation_text: str) -> bool:
-    """Check if the legislation text is valid and well-structured."""
+async def validate_legislation_content_async(
+    legislation_text: str, rate_limiter: RateLimiter = None
+) -> LegislationValidation:
+    """Async variant of validate_legislation_content."""
+    rate_limiter = rate_limiter or validation_rate_limiter
+    completions = await rate_limiter.make_request_with_retry_async(
+        async_client.beta.chat.completions.parse,
+        **_validation_request(legislation_text),
+    )
+    return completions.choices[0].message.parsed
+
+
+def validate_locally(legislation_text: str) -> Optional[bool]:
+    """Decide obvious cases from the local score, None if the model must be asked."""
     logger.info("Validating legislation content...")
 
-    validation = validate_legislation_content(legislation_text)
+    started = time.perf_counter()
+    score = score_legislation(legislation_text)
+    validation_stats["local_seconds"] += time.perf_counter() - started
+    if score is not None and score >= LOCAL_ACCEPT_SCORE:
+        validation_stats["local_accepted"] += 1
+        logger.info(f"Validation successful: local score {score:.2f}")
+        return True
+    if score is not None and score <= LOCAL_REJECT_SCORE:
+        validation_stats["local_rejected"] += 1
+        logger.warning(f"Validation failed: local score {score:.2f}")
+        return False
+    return None
+
+
+def validate_with_model(legislation_text: str, rate_limiter: RateLimiter = None) -> bool:
+    """Ask the model whether the text is legislation."""
+    started = time.perf_counter()
+    validation = validate_legislation_content(legislation_text, rate_limiter)
+    validation_stats["model_calls"] += 1
+    validation_stats["model_seconds"] += time.perf_counter() - started
+    return is_valid_legislation(validation)
+
+
+async def validate_with_model_async(
+    legislation_text: str, rate_limiter: RateLimiter = None
+) -> bool:
+    """Async variant of validate_with_model."""
+    started = time.perf_counter()
+    validation = await validate_legislation_content_async(legislation_text, rate_limiter)
+    validation_stats["model_calls"] += 1
+    validation_stats["model_seconds"] += time.perf_counter() - started
+    return is_valid_legislation(validation)
+
+
+def validate_legislation(legislation_text: str) -> bool:
+    """Check if the legislation text is valid and well-structured.
+
+    Obvious cases are decided by the local score. The model is asked only
+    when the score is in between or the text is too short to score.
+    """
+    valid = validate_locally(legislation_text)
+    if valid is None:
+        valid = validate_with_model(legislation_text)
+    return valid
 
+
+def is_valid_legislation(validation: LegislationValidation) -> bool:
+    """Whether the model's validation is confident the text is legislation."""
     is_valid = validation.is_legislation and validation.confidence_score >= 0.7
 
     if not is_valid:
@@ -302,6 +857,27 @@ def validate_legislation(legislation_text: str) -> bool:
     return is_valid
 
 
+def validation_report(stats: Counter) -> str:
+    """Summarize how many validations the local score saved a model call."""
+    local = stats["local_accepted"] + stats["local_rejected"]
+    total = local + stats["model_calls"]
+    if not total:
+        return "No validations"
+    report = (
+        f"{local} of {total} validations decided locally "
+        f"({stats['local_accepted']} accepted, {stats['local_rejected']} rejected) "
+        f"in {stats['local_seconds'] * 1000:.1f} ms, "
+        f"model call rate {stats['model_calls'] / total:.0%}"
+    )
+    if stats["model_calls"]:
+        mean_latency = stats["model_seconds"] / stats["model_calls"]
+        report += (
+            f", {mean_latency:.2f}s mean model latency, "
+            f"about {local * mean_latency:.1f}s saved"
+        )
+    return report
+
+
 # -----------------------------------------------------------
 # Step 2: Define prompts
 # -----------------------------------------------------------
@@ -316,130 +892,1514 @@ Please provide a detailed analysis of the legislation, including:
 Ensure your analysis is comprehensive and captures the nuances of the legislative text.
 """
 
+REDUCE_PROMPT = """
+You are an expert in U.S. legislation drafting. You are given overviews of consecutive parts of a single bill, in document order.
+Combine them into one overview of the whole bill:
+1. Use the official short title of the act.
+2. Join the tables of contents into one outline of the bill's structure.
+3. Summarize the findings or purpose of the bill as a whole.
+4. Combine the authorizations of appropriations and the effective dates, keeping amounts, fiscal years and conditions.
+Leave a field empty only if none of the parts provide it.
+"""
+
 # -----------------------------------------------------------
 # Step 3: Implement the orchestrator
 # -----------------------------------------------------------
 
 
+class ChunkMerger:
+    """Merges chunk analyses into one Legislation as they come back.
+
+    Results arrive in any order but are folded in chunk order, so only those
+    that overtook a slower earlier chunk are held in memory. Failed chunks are
+    skipped so they don't stall the ones after them.
+
+    Chunks overlap, so the same section or definition is often reported by two
+    neighbouring chunks, once cut short. Entries are compared on normalized
+    text: exact repeats are dropped by fingerprint, an entry contained in one
+    from the previous chunk is collapsed into the longer of the two, and a
+    section is combined with one of the same number in its own or the
+    previous chunk whose content it contains, is contained in, or continues
+    where that was cut off. Bills reuse headings like "SEC. 101.
+    DEFINITIONS." in every division, so a matching heading alone never
+    combines sections, and sections further apart are never combined.
+    Collapsed entries are counted per field in `duplicates`.
+
+    Streamed sections of the next chunk in order are merged one by one with
+    add_section() as they arrive, and skipped when its analysis is added.
+    """
+
+    LIST_FIELDS = ["definitions", "amendments"]
+    LEGALESE_LIST_FIELDS = [
+        "reporting_requirements",
+        "enforcement_provisions",
+        "conforming_amendments",
+    ]
+    LEGALESE_TEXT_FIELDS = [
+        "severability_clause",
+        "sunset_clause",
+        "regulatory_authority",
+    ]
+    NEAR_DUPLICATE_MIN_CHARS = 32  # Shorter entries must match exactly
+
+    def __init__(self, keep_overviews: bool = False):
+        self.merged = empty_legislation()
+        self.next_index = 0
+        self.held: Dict[int, Optional[Legislation]] = {}
+        self.streamed = Counter()  # Chunk index -> sections streamed so far
+        self.merged_early = Counter()  # Chunk index -> sections merged by add_section
+        self.merged_chunks = 0
+        self.peak_held = 0
+        self.seen: Dict[str, set] = {}  # Field -> fingerprints of its entries
+        self.recent: Dict[str, List[list]] = {}  # Field -> [normalized, index] from the last chunk
+        # Section number -> [(index, content)] of the previous and current chunk
+        self.previous_sections: Dict[str, List[tuple]] = {}
+        self.current_sections: Dict[str, List[tuple]] = {}
+        self.sections_chunk = -1  # Chunk whose sections are current_sections
+        self.duplicates = Counter()
+        # Document-level fields of each merged chunk, in order, for the tree reduce
+        self.overviews: Optional[List[LegislationOverview]] = (
+            [] if keep_overviews else None
+        )
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace."""
+        return " ".join(re.sub(r"[^\w\s]", " ", (text or "").lower()).split())
+
+    @classmethod
+    def fingerprint(cls, text: str) -> bytes:
+        return hashlib.blake2b(
+            cls.normalize(text).encode("utf-8"), digest_size=16
+        ).digest()
+
+    @classmethod
+    def _near_duplicate(cls, a: str, b: str) -> bool:
+        shorter, longer = sorted((a, b), key=len)
+        return len(shorter) >= cls.NEAR_DUPLICATE_MIN_CHARS and shorter in longer
+
+    @classmethod
+    def _overlap(cls, earlier: str, later: str) -> int:
+        """How much of the end of `earlier` that `later` starts by repeating,
+        as a section cut off by one chunk is picked up by the next one."""
+        head = later[: cls.NEAR_DUPLICATE_MIN_CHARS]
+        if len(head) < cls.NEAR_DUPLICATE_MIN_CHARS:
+            return 0
+        start = earlier.find(head)
+        while start != -1:
+            if later.startswith(earlier[start:]):
+                return len(earlier) - start
+            start = earlier.find(head, start + 1)
+        return 0
+
+    def add(self, index: int, analysis: Optional[Legislation]):
+        """Accept the analysis of chunk `index`, or None if it failed."""
+        self.held[index] = analysis
+        self.peak_held = max(self.peak_held, len(self.held))
+        while self.next_index in self.held:
+            self._fold(
+                self.next_index,
+                self.held.pop(self.next_index),
+                self._merged_early(self.next_index),
+            )
+            self.next_index += 1
+
+    def skip(self, index: int):
+        self.add(index, None)
+
+    def add_section(self, index: int, section: LegislationSection):
+        """Merge a streamed section of chunk `index` ahead of the rest of its analysis.
+
+        Only sections of the next chunk in order are merged now, and only if
+        none of its earlier sections were passed over, so the merge stays
+        positional. The others are merged with their chunk's analysis.
+        """
+        if index == self.next_index and self.merged_early[index] == self.streamed[index]:
+            self._merge_sections(index, [section])
+            self.merged_early[index] += 1
+        self.streamed[index] += 1
+
+    def _merged_early(self, index: int) -> int:
+        self.streamed.pop(index, None)
+        return self.merged_early.pop(index, 0)
+
+    def _extend_unique(self, field: str, target: List[str], items: List[str]):
+        """Append the entries of `items` that aren't already in `target`."""
+        seen = self.seen.setdefault(field, set())
+        previous = self.recent.get(field, [])
+        current = []
+        for item in items:
+            if not item:
+                continue
+            digest = self.fingerprint(item)
+            if digest in seen:
+                self.duplicates[field] += 1
+                continue
+            seen.add(digest)
+
+            normalized = self.normalize(item)
+            for entry in previous + current:
+                if self._near_duplicate(entry[0], normalized):
+                    self.duplicates[field] += 1
+                    if len(normalized) > len(entry[0]):
+                        target[entry[1]] = item  # Keep the complete one
+                        entry[0] = normalized
+                    break
+            else:
+                current.append([normalized, len(target)])
+                target.append(item)
+        self.recent[field] = current
+
+    def _merge_sections(self, index: int, sections: List[LegislationSection]):
+        if index != self.sections_chunk:
+            # Only a chunk's direct predecessor overlaps it
+            adjacent = index == self.sections_chunk + 1
+            self.previous_sections = self.current_sections if adjacent else {}
+            self.current_sections = {}
+            self.sections_chunk = index
+        merged = self.merged.sections
+        seen = self.seen.setdefault("sections", set())
+        for section in sections:
+            digest = self.fingerprint(
+                f"{section.section_number}\n{section.title}\n{section.content}"
+            )
+            if digest in seen:
+                self.duplicates["sections"] += 1
+                continue
+            seen.add(digest)
+
+            key = self.normalize(section.section_number)
+            content = self.normalize(section.content)
+            previous = self.previous_sections.get(key, []) if key else []
+            current = self.current_sections.setdefault(key, []) if key else []
+            if self._match_section(current, section, content):
+                continue
+            match = self._match_section(previous, section, content)
+            if match:
+                # A section running on through this chunk may reach the next one too
+                current.append(match)
+                continue
+            current.append((len(merged), content))
+            merged.append(section.model_copy())
+
+    def _match_section(
+        self, candidates: List[tuple], section: LegislationSection, content: str
+    ) -> Optional[tuple]:
+        """Combine `section` into the candidate whose content overlaps its
+        own, returning the candidate, or None if there is none.
+
+        The candidates have the section's number, and came before it.
+        """
+        merged = self.merged.sections
+        for i, (position, known_content) in enumerate(candidates):
+            existing = merged[position]
+            if self._near_duplicate(known_content, content):
+                if len(section.content) > len(existing.content):
+                    existing.content = section.content  # Keep the complete one
+                    candidates[i] = (position, content)
+            else:
+                overlap = self._overlap(known_content, content)
+                if not overlap:
+                    continue
+                # Join the two halves, or keep the longer if the text around the cut differs
+                raw_overlap = self._overlap(existing.content, section.content)
+                if raw_overlap:
+                    existing.content += section.content[raw_overlap:]
+                elif len(section.content) > len(existing.content):
+                    existing.content = section.content
+                candidates[i] = (position, known_content + content[overlap:])
+            self.duplicates["sections"] += 1
+            existing.title = existing.title or section.title
+            existing.notes = existing.notes or section.notes
+            existing.uncommon_section |= section.uncommon_section
+            return candidates[i]
+        return None
+
+    def _fold(
+        self, index: int, analysis: Optional[Legislation], merged_sections: int = 0
+    ):
+        if analysis is None:
+            return
+        merged = self.merged
+        self._merge_sections(index, analysis.sections[merged_sections:])
+        for field in self.LIST_FIELDS:
+            self._extend_unique(field, getattr(merged, field), getattr(analysis, field))
+
+        # Take the first non-empty value for single-value fields
+        if not merged.short_title and analysis.short_title:
+            merged.short_title = analysis.short_title
+        if not merged.table_of_contents and analysis.table_of_contents:
+            merged.table_of_contents = analysis.table_of_contents
+        if not merged.findings_or_purpose and analysis.findings_or_purpose:
+            merged.findings_or_purpose = analysis.findings_or_purpose
+        if (
+            not merged.authorization_of_appropriations
+            and analysis.authorization_of_appropriations
+        ):
+            merged.authorization_of_appropriations = (
+                analysis.authorization_of_appropriations
+            )
+        if not merged.effective_date and analysis.effective_date:
+            merged.effective_date = analysis.effective_date
+
+        if self.overviews is not None:
+            self.overviews.append(
+                LegislationOverview(
+                    **{
+                        field: getattr(analysis, field) or ""
+                        for field in LegislationOverview.model_fields
+                    }
+                )
+            )
+
+        legalese = analysis.legalese
+        for field in self.LEGALESE_TEXT_FIELDS:
+            if not getattr(merged.legalese, field) and getattr(legalese, field):
+                setattr(merged.legalese, field, getattr(legalese, field))
+        for field in self.LEGALESE_LIST_FIELDS:
+            self._extend_unique(
+                f"legalese.{field}",
+                getattr(merged.legalese, field),
+                getattr(legalese, field),
+            )
+        self.merged_chunks += 1
+
+    def result(self) -> Legislation:
+        """Fold whatever is still held back and return the merged analysis."""
+        for index in sorted(self.held):
+            self._fold(index, self.held.pop(index), self._merged_early(index))
+        return self.merged
+
+
+class LongestFirstScheduler:
+    """Hands out chunks for dispatch longest processing time first (LPT).
+
+    A chunk's cost is estimated from its prompt tokens and the number of
+    sections it holds, since every section adds an entry to the response and
+    decoding the response is most of a request's time. Sending the costliest
+    chunks first leaves the cheap ones, like the trimmed last chunk, to fill
+    the workers at the end instead of one long chunk running on alone.
+
+    Chunks are added as they are cut, and each free request slot takes the
+    costliest chunk cut so far, so dispatch overlaps the chunking. The
+    chunker runs far ahead of the requests, so after the first few slots
+    the choice is among nearly all of the document's chunks.
+    """
+
+    # Prefill runs roughly ten times as fast as decoding, and a section's
+    # entry in the response is around a hundred tokens
+    PROMPT_TOKENS_PER_OUTPUT_TOKEN = 10
+    OUTPUT_TOKENS_PER_SECTION = 100
+
+    def __init__(self):
+        self.heap: List[tuple] = []  # (-cost, index, chunk)
+
+    def cost(self, chunk: TextChunk) -> float:
+        """Estimated cost of a chunk's request, in decoded tokens."""
+        prompt_tokens = chunk.token_count or len(chunk.text) // CHARS_PER_TOKEN
+        sections = sum(
+            1
+            for match in LegislationSegmenter.HEADING_PATTERN.finditer(chunk.text)
+            if match.group("section")
+        )
+        return (
+            prompt_tokens / self.PROMPT_TOKENS_PER_OUTPUT_TOKEN
+            + sections * self.OUTPUT_TOKENS_PER_SECTION
+        )
+
+    def add(self, index: int, chunk: TextChunk):
+        # The index breaks ties, so chunks of equal cost go in document order
+        heapq.heappush(self.heap, (-self.cost(chunk), index, chunk))
+
+    def next(self) -> tuple[int, TextChunk]:
+        """Take the costliest chunk waiting, with its document index."""
+        _, index, chunk = heapq.heappop(self.heap)
+        return index, chunk
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+
 class LegislationOrchestrator:
     """Orchestrator for analyzing legislation."""
 
-    def __init__(self):
-        self.chunker = TextChunker(chunk_size=15000, overlap=200)
+    def __init__(
+        self,
+        chunking: str = "tokens",
+        max_concurrency: int = None,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        adaptive_concurrency: bool = False,
+        cache_path: str = None,
+        token_cache_dir: str = None,
+        manifest_path: str = None,
+        resume: bool = False,
+        previous_manifest: str = None,
+        chunk_output: str = None,
+        tree_reduce: bool = False,
+        reduce_fan_in: int = 8,
+        rate_limiter: RateLimiter = None,
+        request_slots: asyncio.Semaphore = None,
+        stream: bool = False,
+        schedule: str = "document",
+        split_extraction: bool = False,
+    ):
+        if stream and split_extraction:
+            raise ValueError("Streaming and split extraction can't be combined")
+        # Fill the context window, less the response and the system prompt
+        encoding = tiktoken.encoding_for_model("gpt-4o")
+        self.system_tokens = len(encoding.encode(ORCHESTRATOR_PROMPT))
+        self.chunker = TextChunker(
+            chunk_size=profile.input_tokens(self.system_tokens),
+            overlap=200,
+            cache_dir=token_cache_dir,  # Tokenize the document only once across runs
+        )
+        # In-flight requests, by default as many as the model's profile can keep
+        # busy on each server, or as the routed backends can together
+        if isinstance(client, BackendRouter):
+            default_concurrency = client.concurrency()
+            self.models = [backend.model for backend in client.backends]
+        else:
+            self.models = [model]
+            servers = len(client) if isinstance(client, ClientPool) else 1
+            default_concurrency = profile.concurrency() * servers
+        if adaptive_concurrency and not max_concurrency:
+            # The profile's figure is where the controller starts, it can find
+            # the server takes more
+            max_concurrency = default_concurrency * ADAPTIVE_HEADROOM
+        max_concurrency = max_concurrency or default_concurrency
+        # "tokens" cuts overlapping fixed-size windows, "sections" packs whole sections
+        self.chunking = chunking
+        self.splitter = (
+            LegislationSegmenter(self.chunker) if chunking == "sections" else self.chunker
+        )
         self.legislation_content: Dict = {}
-        self.rate_limiter = RateLimiter(requests_per_minute=50)
-
-    def _make_api_request(self, chunk_text: str) -> Dict:
-        """Make an API request with rate limiting."""
-        # Count tokens in the prompt and content
-        encoding = self.chunker.encoding
-        system_tokens = len(encoding.encode(ORCHESTRATOR_PROMPT))
-        content_tokens = len(encoding.encode(chunk_text))
-        total_tokens = system_tokens + content_tokens
+        # With adaptive concurrency the controller finds the in-flight limit
+        # between 1 and max_concurrency from 429s and latency
+        self.concurrency = (
+            ConcurrencyController(
+                initial=min(default_concurrency, max_concurrency),
+                maximum=max_concurrency,
+            )
+            if adaptive_concurrency
+            else None
+        )
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            controller=self.concurrency,
+        )
+        if rate_limiter:
+            # Share one rate budget, and its concurrency controller, between orchestrators
+            self.rate_limiter = rate_limiter
+            self.concurrency = rate_limiter.controller
+        # Bounds the async engine's requests in flight, shareable the same way
+        self.request_slots = request_slots
+        self.max_concurrency = max_concurrency  # In-flight requests on the async engine
+        self.max_workers = max_concurrency
+        self.cache = (
+            AnalysisCache(cache_path, model, ORCHESTRATOR_PROMPT, Legislation)
+            if cache_path
+            else None
+        )
+        self.manifest_path = manifest_path  # Checkpoint each chunk to this file
+        self.resume = resume  # Only dispatch chunks the manifest doesn't have
+        self.manifest = None
+        # Manifest of a run over an earlier version of the bill. Chunks whose
+        # text is unchanged reuse its analyses and only edited chunks are sent.
+        self.previous_manifest = previous_manifest
+        self.previous_analyses: Dict[str, tuple[Legislation, Optional[str]]] = {}
+        self.reused_chunks = 0
+        self.chunk_output = chunk_output  # Stream each chunk's analysis to this JSONL file
+        self.sink = None
+        # Stream responses, merging each section as it is generated and
+        # cutting off runaway generations
+        self.stream = stream
+        self.merge_lock = threading.Lock()  # Sections arrive from worker threads
+        # Request the parts of each chunk's analysis concurrently. Every part
+        # takes a request slot, so at most max_concurrency requests are in
+        # flight. Chunks aren't limited to a share of the slots, since the short
+        # parts finish long before the sections and free theirs for other chunks.
+        # It triples the requests, so it only pays off while slots would
+        # otherwise sit idle, e.g. on a document of fewer chunks than that.
+        # The thread pool and slots are set up for each run.
+        self.split_extraction = split_extraction
+        self.part_slots = None
+        self.async_part_slots = None
+        self.part_executor = None
+        # "document" dispatches chunks as they are cut, "longest-first" the
+        # costliest of those cut so far. Either way they merge in order.
+        self.schedule = schedule
+        # Combine the document-level fields of all chunks with the model, in
+        # levels of batches of at most reduce_fan_in, instead of taking the
+        # first non-empty value
+        self.tree_reduce = tree_reduce
+        self.reduce_fan_in = max(reduce_fan_in, 2)
+        self.reduce_prompt_tokens = len(self.chunker.encoding.encode(REDUCE_PROMPT))
+        if previous_manifest and chunking != "sections":
+            logger.warning(
+                "Fixed token windows all shift after an edit, use section chunking "
+                "to re-analyze only the changed chunks"
+            )
 
-        if total_tokens > MAX_CONTEXT_LENGTH:
+    def _served_model(self, reported: Optional[str]) -> Optional[str]:
+        """The model, of those the requests can go to, that served a response.
+
+        Hosted APIs report a dated snapshot of the model asked for, so the
+        longest model the reported name starts with is taken. None if it
+        can't be told, in which case the analysis isn't cached.
+        """
+        if reported:
+            matches = [name for name in self.models if reported.startswith(name)]
+            if matches:
+                return max(matches, key=len)
+        return self.models[0] if len(self.models) == 1 else None
+
+    @staticmethod
+    def _routed(request: Dict, total_tokens: int) -> Dict:
+        """Pass a BackendRouter the prompt's token count, which it charges each
+        backend's token budget, rather than have it estimate one."""
+        if isinstance(client, BackendRouter):
+            return {**request, "prompt_tokens": total_tokens}
+        return request
+
+    def _build_request(
+        self, chunk_text: str, content_tokens: int = None
+    ) -> tuple[Dict, int]:
+        """Check the chunk fits the context window and build the request arguments.
+
+        Returns the arguments together with the prompt token count, which the
+        rate limiter charges against its tokens-per-minute budget.
+        """
+        # Count tokens in the content, unless the chunker already did
+        if content_tokens is None:
+            content_tokens = len(self.chunker.encoding.encode(chunk_text))
+        total_tokens = self.system_tokens + content_tokens
+
+        max_input_tokens = profile.input_tokens()
+        if total_tokens > max_input_tokens:
             logger.error(
                 f"Total tokens ({total_tokens}) exceeds maximum context length"
             )
             raise ValueError(
-                f"Input too large: {total_tokens} tokens (max {MAX_CONTEXT_LENGTH})"
+                f"Input too large: {total_tokens} tokens (max {max_input_tokens})"
             )
 
-        logger.info(f"Making API request with {total_tokens} total tokens")
-        return self.rate_limiter.make_request_with_retry(
-            client.beta.chat.completions.parse,
-            model=model,
-            messages=[
+        logger.debug(f"Making API request with {total_tokens} total tokens")
+        request = {
+            "model": model,
+            "messages": [
                 {"role": "system", "content": ORCHESTRATOR_PROMPT},
                 {"role": "user", "content": chunk_text},
             ],
-            response_format=Legislation,
+            "response_format": Legislation,
+        }
+        return request, total_tokens
+
+    def _make_api_request(self, chunk_text: str, content_tokens: int = None) -> Dict:
+        """Make an API request with rate limiting."""
+        request, total_tokens = self._build_request(chunk_text, content_tokens)
+        return self.rate_limiter.make_request_with_retry(
+            client.beta.chat.completions.parse,
+            token_cost=total_tokens,
+            **self._routed(request, total_tokens),
+        )
+
+    async def _make_api_request_async(
+        self, chunk_text: str, content_tokens: int = None
+    ) -> Dict:
+        """Make a non-blocking API request with rate limiting."""
+        request, total_tokens = self._build_request(chunk_text, content_tokens)
+        return await self.rate_limiter.make_request_with_retry_async(
+            async_client.beta.chat.completions.parse,
+            token_cost=total_tokens,
+            **self._routed(request, total_tokens),
+        )
+
+    @contextmanager
+    def _part_requests(self):
+        """Hold the thread pool and request slots of split extraction for a run."""
+        if not self.split_extraction:
+            yield
+            return
+        self.part_slots = threading.Semaphore(self.max_concurrency)
+        self.part_executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency * (len(EXTRACTION_PARTS) - 1),
+            thread_name_prefix="extract-part",
+        )
+        try:
+            yield
+        finally:
+            self.part_executor.shutdown()
+            self.part_executor = None
+
+    def _request_part(
+        self, part: type, chunk: TextChunk
+    ) -> tuple[BaseModel, Optional[str]]:
+        """Extract one part of the chunk's analysis with rate limiting.
+
+        Returns the part and the model that served it.
+        """
+        request, total_tokens = self._build_request(chunk.text, chunk.token_count)
+        request["response_format"] = part
+        with self.part_slots:
+            completions = self.rate_limiter.make_request_with_retry(
+                client.beta.chat.completions.parse,
+                token_cost=total_tokens,
+                **self._routed(request, total_tokens),
+            )
+        parsed = completions.choices[0].message.parsed
+        if parsed is None:
+            raise ValueError(f"The model returned no parsed {part.__name__}")
+        return parsed, self._served_model(getattr(completions, "model", None))
+
+    async def _request_part_async(
+        self, part: type, chunk: TextChunk
+    ) -> tuple[BaseModel, Optional[str]]:
+        """Async variant of _request_part."""
+        request, total_tokens = self._build_request(chunk.text, chunk.token_count)
+        request["response_format"] = part
+        async with self.async_part_slots:
+            completions = await self.rate_limiter.make_request_with_retry_async(
+                async_client.beta.chat.completions.parse,
+                token_cost=total_tokens,
+                **self._routed(request, total_tokens),
+            )
+        parsed = completions.choices[0].message.parsed
+        if parsed is None:
+            raise ValueError(f"The model returned no parsed {part.__name__}")
+        return parsed, self._served_model(getattr(completions, "model", None))
+
+    @staticmethod
+    def _assemble_parts(parts: List[tuple[BaseModel, Optional[str]]]):
+        """Assemble the parts into the chunk's analysis and the model that served
+        it, None if the parts were routed to different models."""
+        served = {model_name for _, model_name in parts}
+        return (
+            assemble_legislation(*(part for part, _ in parts)),
+            served.pop() if len(served) == 1 else None,
         )
 
-    def analyze_chunk(self, chunk_data: tuple[str, int]) -> Dict:
-        """Analyze a single chunk of legislation."""
-        chunk_text, position = chunk_data
-        logger.info(f"Analyzing chunk at position {position}...")
+    def _extract_parts(self, chunk: TextChunk) -> tuple[Legislation, Optional[str]]:
+        """Extract the parts of the chunk's analysis concurrently and assemble them.
+
+        Several short responses decode in parallel instead of one long one.
+        The parts share the messages and differ only in the response format,
+        so a server with prefix caching processes the chunk's prompt once.
+        """
+        if self.part_executor is None:
+            # Called on its own rather than by analyze_legislation
+            with self._part_requests():
+                return self._extract_parts(chunk)
+        first, *rest = EXTRACTION_PARTS
+        futures = [
+            self.part_executor.submit(self._request_part, part, chunk) for part in rest
+        ]
+        try:
+            parts = [self._request_part(first, chunk)]
+        except Exception:
+            wait(futures)  # The chunk fails once all its requests are done
+            raise
+        parts += [future.result() for future in futures]
+        return self._assemble_parts(parts)
+
+    async def _extract_parts_async(
+        self, chunk: TextChunk
+    ) -> tuple[Legislation, Optional[str]]:
+        """Async variant of _extract_parts."""
+        if self.async_part_slots is None:
+            # Made in the running event loop, which this call may not share
+            self.async_part_slots = asyncio.Semaphore(self.max_concurrency)
+        parts = await asyncio.gather(
+            *(self._request_part_async(part, chunk) for part in EXTRACTION_PARTS)
+        )
+        return self._assemble_parts(parts)
+
+    def _build_stream_request(
+        self, chunk_text: str, content_tokens: int = None
+    ) -> tuple[Dict, int]:
+        """Build the arguments of a streamed request for the chunk's analysis."""
+        request, total_tokens = self._build_request(chunk_text, content_tokens)
+        request.update(
+            response_format=sections_first(json_schema_format(Legislation)),
+            stream=True,
+            stream_options={"include_usage": True},
+            # The server stops a runaway generation at the response budget too
+            max_tokens=profile.output_tokens,
+        )
+        return request, total_tokens
+
+    def _new_section_stream(self) -> SectionStream:
+        return SectionStream(Legislation)
+
+    @staticmethod
+    def _on_stream_sections(
+        stream: SectionStream, sections: List[LegislationSection], started: float, on_section
+    ):
+        if sections and len(stream.sections) == len(sections):
+            metrics.observe("chunk_first_section_seconds", time.monotonic() - started)
+        if on_section:
+            for section in sections:
+                on_section(section)
+
+    def _read_stream(self, on_section=None, **request) -> StreamedAnalysis:
+        """Send a streamed request, passing each section to `on_section` as it completes."""
+        started = time.monotonic()
+        stream = self._new_section_stream()
+        usage = aborted = served = None
+        response = client.chat.completions.create(**request)
+        try:
+            for event in response:
+                usage = getattr(event, "usage", None) or usage
+                served = getattr(event, "model", None) or served
+                if not event.choices:
+                    continue
+                sections = stream.feed(event.choices[0].delta.content or "")
+                self._on_stream_sections(stream, sections, started, on_section)
+                aborted = stream.runaway()
+                if aborted:
+                    break
+        finally:
+            response.close()  # Stops the generation if the stream was cut off
+        return StreamedAnalysis(stream, usage, aborted, served)
+
+    async def _read_stream_async(self, on_section=None, **request) -> StreamedAnalysis:
+        """Async variant of _read_stream."""
+        started = time.monotonic()
+        stream = self._new_section_stream()
+        usage = aborted = served = None
+        response = await async_client.chat.completions.create(**request)
+        try:
+            async for event in response:
+                usage = getattr(event, "usage", None) or usage
+                served = getattr(event, "model", None) or served
+                if not event.choices:
+                    continue
+                sections = stream.feed(event.choices[0].delta.content or "")
+                self._on_stream_sections(stream, sections, started, on_section)
+                aborted = stream.runaway()
+                if aborted:
+                    break
+        finally:
+            await response.close()
+        return StreamedAnalysis(stream, usage, aborted, served)
+
+    def _streamed_analysis(self, chunk: TextChunk, streamed: StreamedAnalysis):
+        """Turn a read stream into the chunk's analysis and whether to cache it."""
+        if streamed.aborted:
+            metrics.inc("llm_streams_aborted_total", reason=streamed.aborted)
+            logger.warning(
+                f"Stopped a runaway response ({streamed.aborted}) for chunk at position "
+                f"{chunk.position}, keeping its {len(streamed.stream.sections)} sections"
+            )
+            return empty_legislation(streamed.stream.sections), False
+        analysis = streamed.stream.result()
+        if analysis is not None:
+            return analysis, True
+        if not streamed.stream.sections:
+            raise ValueError("The model's streamed response is not a valid analysis")
+        # Most likely cut off by the server at max_tokens
+        metrics.inc("llm_streams_aborted_total", reason="truncated")
+        logger.warning(
+            f"Incomplete response for chunk at position {chunk.position}, "
+            f"keeping its {len(streamed.stream.sections)} sections"
+        )
+        return empty_legislation(streamed.stream.sections), False
+
+    def analyze_chunk(self, chunk_data: tuple[str, int], on_section=None) -> Dict:
+        """Analyze a single chunk of legislation.
+
+        When streaming, each section is passed to `on_section` as soon as it
+        is generated.
+        """
+        chunk = TextChunk(*chunk_data)
+        if self.cache:
+            analysis, served = self.cache.lookup(chunk.text, self.models)
+            if analysis is not None:
+                logger.info(f"Using cached analysis for chunk at position {chunk.position}")
+                metrics.inc("chunk_cache_hits_total")
+                return {"position": chunk.position, "analysis": analysis, "model": served}
+
+        logger.info(f"Analyzing chunk at position {chunk.position}...")
+        started = time.monotonic()
+        complete = True
+        if self.stream:
+            request, total_tokens = self._build_stream_request(
+                chunk.text, chunk.token_count
+            )
+            streamed = self.rate_limiter.make_request_with_retry(
+                self._read_stream,
+                token_cost=total_tokens,
+                on_section=on_section,
+                **self._routed(request, total_tokens),
+            )
+            analysis, complete = self._streamed_analysis(chunk, streamed)
+            served = self._served_model(streamed.model)
+        elif self.split_extraction:
+            analysis, served = self._extract_parts(chunk)
+        else:
+            completions = self._make_api_request(chunk.text, chunk.token_count)
+            analysis = completions.choices[0].message.parsed
+            served = self._served_model(getattr(completions, "model", None))
+        if analysis is None:
+            raise ValueError("The model returned no parsed analysis")
+        # Includes rate limiter waits and retries, unlike llm_request_duration_seconds
+        metrics.observe("chunk_analysis_seconds", time.monotonic() - started)
+        if self.cache and complete and served:
+            self.cache.put(chunk.text, analysis, served)
+        return {"position": chunk.position, "analysis": analysis, "model": served}
+
+    async def analyze_chunk_async(
+        self, chunk_data: tuple[str, int], on_section=None
+    ) -> Dict:
+        """Analyze a single chunk of legislation without blocking the event loop."""
+        chunk = TextChunk(*chunk_data)
+        if self.cache:
+            analysis, served = self.cache.lookup(chunk.text, self.models)
+            if analysis is not None:
+                logger.info(f"Using cached analysis for chunk at position {chunk.position}")
+                metrics.inc("chunk_cache_hits_total")
+                return {"position": chunk.position, "analysis": analysis, "model": served}
+
+        logger.info(f"Analyzing chunk at position {chunk.position}...")
+        started = time.monotonic()
+        complete = True
+        if self.stream:
+            request, total_tokens = self._build_stream_request(
+                chunk.text, chunk.token_count
+            )
+            streamed = await self.rate_limiter.make_request_with_retry_async(
+                self._read_stream_async,
+                token_cost=total_tokens,
+                on_section=on_section,
+                **self._routed(request, total_tokens),
+            )
+            analysis, complete = self._streamed_analysis(chunk, streamed)
+            served = self._served_model(streamed.model)
+        elif self.split_extraction:
+            analysis, served = await self._extract_parts_async(chunk)
+        else:
+            completions = await self._make_api_request_async(
+                chunk.text, chunk.token_count
+            )
+            analysis = completions.choices[0].message.parsed
+            served = self._served_model(getattr(completions, "model", None))
+        if analysis is None:
+            raise ValueError("The model returned no parsed analysis")
+        # Includes rate limiter waits and retries, unlike llm_request_duration_seconds
+        metrics.observe("chunk_analysis_seconds", time.monotonic() - started)
+        if self.cache and complete and served:
+            self.cache.put(chunk.text, analysis, served)
+        return {"position": chunk.position, "analysis": analysis, "model": served}
+
+    def _open_manifest(
+        self, legislation_text: Union[str, TextIO]
+    ) -> Dict[int, Legislation]:
+        """Start the run manifest, returning chunks completed by a previous run."""
+        if self.previous_manifest:
+            # Read it before the new manifest, which may be the same file, is truncated
+            self.previous_analyses = RunManifest.load_chunk_analyses(
+                self.previous_manifest, Legislation, self.models
+            )
+            logger.info(
+                f"Loaded {len(self.previous_analyses)} chunk analyses from {self.previous_manifest}"
+            )
+        self.reused_chunks = 0
+
+        if not self.manifest_path:
+            return {}
+        run = {
+            "document": TokenCache.content_hash(legislation_text),
+            "model": self.models[0] if len(self.models) == 1 else self.models,
+            "prompt": hashlib.sha256(ORCHESTRATOR_PROMPT.encode("utf-8")).hexdigest(),
+            "chunking": self.chunking,
+            "chunk_size": self.chunker.chunk_size,
+            "overlap": self.chunker.overlap,
+        }
+        self.manifest = RunManifest(self.manifest_path, run, Legislation)
+        return self.manifest.open(resume=self.resume)
+
+    def _reuse_analysis(
+        self, chunk: TextChunk, completed: Dict[int, Legislation]
+    ) -> Optional[Dict]:
+        """Return the result of a chunk that needs no request, if there is one.
+
+        Chunks are reused from the manifest being resumed, or by content hash
+        from the previous version's manifest.
+        """
+        if chunk.position in completed:
+            # Already recorded in the manifest, with the model that served it
+            return {
+                "position": chunk.position,
+                "analysis": completed[chunk.position],
+                "resumed": True,
+            }
+
+        analysis, served = self.previous_analyses.get(
+            RunManifest.chunk_hash(chunk.text), (None, None)
+        )
+        if analysis is None:
+            return None
+        self.reused_chunks += 1
+        metrics.inc("chunks_reused_total")
+        return {"position": chunk.position, "analysis": analysis, "model": served}
+
+    def _checkpoint(
+        self, index: int, chunk: TextChunk, result: Dict = None, error: Exception = None
+    ):
+        """Record a finished chunk in the manifest."""
+        if not self.manifest:
+            return
+        if error is None:
+            self.manifest.record_done(
+                index, chunk, result["analysis"], result.get("model")
+            )
+        else:
+            self.manifest.record_failed(index, chunk, error)
+
+    def _finish_run(self, merger: ChunkMerger, failed_chunks: List[int]):
+        """Report on the run and check that something came back."""
+        metrics.inc(
+            "phase_seconds_total", time.perf_counter() - self.run_started, phase="run"
+        )
+        if self.manifest:
+            self.manifest.close()
+        if self.sink:
+            self.sink.close()
+            logger.info(f"Wrote chunk analyses to {self.sink.path}")
+
+        if failed_chunks:
+            logger.warning(
+                f"Failed to process {len(failed_chunks)} chunks: {sorted(failed_chunks)}"
+            )
+            if self.manifest:
+                logger.warning("Re-run with --resume to retry them")
+
+        if self.previous_manifest:
+            logger.info(
+                f"Reused {self.reused_chunks} unchanged chunks from the previous version"
+            )
+        if self.concurrency:
+            logger.info(f"Adaptive concurrency: {self.concurrency.summary()}")
+        if self.cache:
+            logger.info(f"Analysis cache: {self.cache.stats()}")
+        logger.info(
+            f"Merged {merger.merged_chunks} chunks, holding at most "
+            f"{merger.peak_held} out-of-order results"
+        )
+        if merger.duplicates:
+            logger.info(
+                f"Collapsed {sum(merger.duplicates.values())} duplicate entries "
+                f"from overlapping chunks: {dict(merger.duplicates)}"
+            )
 
-        completions = self._make_api_request(chunk_text)
-        return {"position": position, "analysis": completions.choices[0].message.parsed}
+        if not merger.merged_chunks and not merger.held:
+            raise Exception("No chunks were successfully processed")
 
-    def analyze_legislation(self, legislation_text: str) -> Legislation:
-        """Analyze the provided legislation text using chunking strategy."""
+    def _start_run(self, legislation_text: Union[str, TextIO]) -> Dict[int, Legislation]:
+        """Open the manifest and chunk sink for a run."""
+        self.run_started = time.perf_counter()
+        completed = self._open_manifest(legislation_text)
+        self.sink = ChunkResultSink(self.chunk_output) if self.chunk_output else None
+        return completed
+
+    def _collect(
+        self,
+        merger: ChunkMerger,
+        index: int,
+        chunk: TextChunk,
+        result: Dict = None,
+        error: Exception = None,
+    ):
+        """Hand a finished chunk to the manifest, the sink and the merger."""
+        if not (result and result.get("resumed")):
+            self._checkpoint(index, chunk, result, error)
+        if error is not None:
+            # Streamed sections merge under the lock from the worker threads
+            with self.merge_lock:
+                kept = merger.merged_early[index]
+                merger.skip(index)
+            if kept:
+                # They can't be taken back out, so the chunk only partly failed
+                logger.warning(
+                    f"Chunk {index} failed after {kept} of its streamed sections "
+                    f"were merged, keeping them"
+                )
+            metrics.inc("chunks_total", outcome="partial" if kept else "failed")
+            return
+        metrics.inc("chunks_total", outcome="done")
+        started = time.perf_counter()
+        with self.merge_lock:
+            if self.sink:
+                self.sink.write(index, chunk, result["analysis"])
+            merger.add(index, result["analysis"])
+        metrics.inc("phase_seconds_total", time.perf_counter() - started, phase="merge")
+
+    def _section_handler(self, merger: ChunkMerger, index: int, chunk: TextChunk):
+        """Callback taking a chunk's streamed sections to the sink and the merger."""
+        if not self.stream:
+            return None
+
+        def on_section(section: LegislationSection):
+            with self.merge_lock:
+                if self.sink:
+                    self.sink.write_section(index, chunk, section)
+                merger.add_section(index, section)
+
+        return on_section
+
+    @staticmethod
+    def _timed_chunks(chunks: Iterable[TextChunk]) -> Iterator[TextChunk]:
+        """Pass chunks through, adding the time spent cutting them to the metrics."""
+        chunks = iter(chunks)
+        while True:
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            metrics.inc(
+                "phase_seconds_total", time.perf_counter() - started, phase="chunking"
+            )
+            if chunk is None:
+                return
+            yield chunk
+
+    def analyze_legislation(
+        self,
+        legislation_text: Union[str, TextIO],
+        chunks: Iterable[TextChunk] = None,
+    ) -> Legislation:
+        """Analyze the provided legislation text using chunking strategy.
+
+        Pass `chunks` if the text was already chunked, e.g. in another process.
+        """
         logger.info("Start analyzing legislation content...")
 
-        chunks = list(self.chunker.create_chunks(legislation_text))
-        results = []
+        completed = self._start_run(legislation_text)
+        merger = ChunkMerger(keep_overviews=self.tree_reduce)
         failed_chunks = []
+        progress = tqdm(desc="Analyzing chunks")
+
+        def collect_future(future):
+            i, chunk = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Failed to process chunk {i}: {str(e)}")
+                failed_chunks.append(i)
+                self._collect(merger, i, chunk, error=e)
+            else:
+                self._collect(merger, i, chunk, result)
+            progress.update()
+
+        # Process chunks in parallel with error handling. Chunks are submitted
+        # as the chunker streams them out, so requests start before the whole
+        # document has been tokenized. Once a few chunks per worker are queued
+        # the chunker waits for one to finish, which keeps memory flat.
+        # With the longest-first schedule, chunks wait in the scheduler and
+        # are only submitted when a worker is free, to the costliest cut so far.
+        with self._part_requests(), ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            pending = {}
+            scheduler = self._new_scheduler()
+
+            def submit(i: int, chunk: TextChunk):
+                on_section = self._section_handler(merger, i, chunk)
+                future = executor.submit(self.analyze_chunk, chunk, on_section)
+                pending[future] = (i, chunk)
+
+            if chunks is None:
+                chunks = self.splitter.create_chunks(legislation_text)
+            for i, chunk in enumerate(self._timed_chunks(chunks)):
+                reused = self._reuse_analysis(chunk, completed)
+                if reused is not None:
+                    self._collect(merger, i, chunk, reused)
+                    continue
+                if scheduler is None:
+                    submit(i, chunk)
+                    if len(pending) >= 2 * self.max_workers:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect_future(future)
+                    continue
+                scheduler.add(i, chunk)
+                for future in [future for future in pending if future.done()]:
+                    collect_future(future)
+                while scheduler and len(pending) < self.max_workers:
+                    submit(*scheduler.next())
+
+            while scheduler:
+                if len(pending) >= self.max_workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect_future(future)
+                while scheduler and len(pending) < self.max_workers:
+                    submit(*scheduler.next())
+            for future in as_completed(list(pending)):
+                collect_future(future)
+        progress.close()
+
+        self._finish_run(merger, failed_chunks)
 
-        # Process chunks in parallel with error handling
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(self.analyze_chunk, chunk) for chunk in chunks]
+        logger.info("Started merging chunk results...")
+        merged_legislation = merger.result()
+        if self.tree_reduce:
+            overview = self._tree_reduce(merger.overviews)
+            self._apply_overview(merged_legislation, overview)
+        logger.info("Finished analyzing legislation...")
+        return merged_legislation
 
-            for i, future in enumerate(tqdm(futures, desc="Analyzing chunks")):
+    def _new_scheduler(self) -> Optional[LongestFirstScheduler]:
+        return LongestFirstScheduler() if self.schedule == "longest-first" else None
+
+    async def _produce_chunks_async(
+        self, legislation_text: Union[str, TextIO], chunks: Iterable[TextChunk] = None
+    ) -> AsyncIterator[TextChunk]:
+        """Run the chunker in a worker thread, yielding chunks as they are cut."""
+        if chunks is not None:
+            for chunk in chunks:
+                yield chunk
+            return
+        chunks = self._timed_chunks(self.splitter.create_chunks(legislation_text))
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def analyze_legislation_async(
+        self,
+        legislation_text: Union[str, TextIO],
+        chunks: Iterable[TextChunk] = None,
+    ) -> Legislation:
+        """Analyze the legislation on the asyncio engine.
+
+        Every chunk becomes a task as soon as it is cut, and a semaphore bounds
+        the requests in flight, so concurrency is not tied to a thread count.
+        """
+        logger.info("Start analyzing legislation content...")
+        completed = await asyncio.to_thread(self._start_run, legislation_text)
+        semaphore = self.request_slots or asyncio.Semaphore(self.max_concurrency)
+        if self.split_extraction:
+            # Slots of this event loop for the parts' requests
+            self.async_part_slots = asyncio.Semaphore(self.max_concurrency)
+        merger = ChunkMerger(keep_overviews=self.tree_reduce)
+        failed_chunks = []
+        progress = tqdm(desc="Analyzing chunks")
+
+        async def analyze_bounded(index: int, chunk: TextChunk) -> tuple:
+            async with semaphore:
+                on_section = self._section_handler(merger, index, chunk)
                 try:
-                    results.append(future.result())
+                    result = await self.analyze_chunk_async(chunk, on_section)
+                    return index, chunk, result, None
                 except Exception as e:
-                    logger.error(f"Failed to process chunk {i}: {str(e)}")
-                    failed_chunks.append(i)
+                    logger.error(f"Failed to process chunk {index}: {str(e)}")
+                    return index, chunk, None, e
+
+        def collect_tasks(done):
+            for task in done:
+                index, chunk, result, error = task.result()
+                if error is not None:
+                    failed_chunks.append(index)
+                self._collect(merger, index, chunk, result, error)
+                progress.update()
+
+        # Results are merged as they complete. The chunker pauses while twice
+        # the concurrency limit is queued, so a long bill isn't held in memory.
+        # With the longest-first schedule, chunks wait in the scheduler until
+        # a slot is free, which then takes the costliest chunk cut so far.
+        tasks = set()
+        scheduler = self._new_scheduler()
+
+        def dispatch():
+            while scheduler and len(tasks) < self.max_concurrency:
+                tasks.add(asyncio.create_task(analyze_bounded(*scheduler.next())))
+
+        index = 0
+        async for chunk in self._produce_chunks_async(legislation_text, chunks):
+            reused = self._reuse_analysis(chunk, completed)
+            if reused is not None:
+                self._collect(merger, index, chunk, reused)
+            elif scheduler is not None:
+                scheduler.add(index, chunk)
+                done = {task for task in tasks if task.done()}
+                tasks -= done
+                collect_tasks(done)
+                dispatch()
+            else:
+                tasks.add(asyncio.create_task(analyze_bounded(index, chunk)))
+            index += 1
+            if len(tasks) >= 2 * self.max_concurrency:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                collect_tasks(done)
 
-        if failed_chunks:
-            logger.warning(
-                f"Failed to process {len(failed_chunks)} chunks: {failed_chunks}"
-            )
+        while scheduler:
+            if len(tasks) >= self.max_concurrency:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                collect_tasks(done)
+            dispatch()
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            collect_tasks(done)
+        progress.close()
 
-        if not results:
-            raise Exception("No chunks were successfully processed")
+        self._finish_run(merger, failed_chunks)
 
-        # Merge results
-        merged_legislation = self._merge_chunk_results(results)
+        logger.info("Started merging chunk results...")
+        merged_legislation = merger.result()
+        if self.tree_reduce:
+            overview = await self._tree_reduce_async(merger.overviews)
+            self._apply_overview(merged_legislation, overview)
         logger.info("Finished analyzing legislation...")
         return merged_legislation
 
     def _merge_chunk_results(self, results: List[Dict]) -> Legislation:
         """Merge the analysis results from multiple chunks."""
         logger.info("Started merging chunk results...")
-        # Sort results by position
-        sorted_results = sorted(results, key=lambda x: x["position"])
-
-        # Initialize merged legislation
-        merged = Legislation(
-            short_title="",
-            table_of_contents="",
-            findings_or_purpose="",
-            definitions=[],
-            amendments=[],
-            authorization_of_appropriations="",
-            effective_date="",
-            sections=[],
+        merger = ChunkMerger(keep_overviews=self.tree_reduce)
+        for index, result in enumerate(sorted(results, key=lambda x: x["position"])):
+            merger.add(index, result["analysis"])
+        merged = merger.result()
+        if self.tree_reduce:
+            self._apply_overview(merged, self._tree_reduce(merger.overviews))
+        logger.info("Finished merging chunk results.")
+        return merged
+
+    @staticmethod
+    def _batch_document(
+        legislation_text: Union[str, TextIO],
+    ) -> tuple[str, Union[str, TextIO]]:
+        """Return the hash naming the document in batch custom IDs, and the text.
+
+        A stream that can't be hashed without consuming it, like stdin, is
+        read into a string first, which is returned to be chunked instead.
+        """
+        document = TokenCache.content_hash(legislation_text)
+        if document is None:
+            legislation_text = legislation_text.read()
+            document = TokenCache.content_hash(legislation_text)
+        return document[:12], legislation_text
+
+    @staticmethod
+    def _batch_custom_id(document: str, index: int, position: int) -> str:
+        return f"{document[:12]}-chunk-{index}-{position}"
+
+    @staticmethod
+    def _parse_batch_custom_id(custom_id: str) -> tuple[str, int]:
+        """Return the document hash prefix and chunk position of a custom ID."""
+        document, _, chunk = custom_id.partition("-chunk-")
+        return document, int(chunk.rsplit("-", 1)[1])
+
+    def export_batch_requests(
+        self, legislation_text: Union[str, TextIO], path: str
+    ) -> int:
+        """Write one chat-completion request per chunk to a batch JSONL file.
+
+        Each line has a custom ID naming its chunk, so the results can be
+        matched up in any order by ingest_batch_results. Returns the number
+        of requests written.
+        """
+        document, legislation_text = self._batch_document(legislation_text)
+        response_format = json_schema_format(Legislation)
+        count = 0
+        with open(path, "w") as f:
+            for index, chunk in enumerate(self.splitter.create_chunks(legislation_text)):
+                try:
+                    request, _ = self._build_request(chunk.text, chunk.token_count)
+                except ValueError as e:
+                    logger.error(f"Skipping chunk {index}: {str(e)}")
+                    continue
+                request["response_format"] = response_format
+                entry = {
+                    "custom_id": self._batch_custom_id(document, index, chunk.position),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": request,
+                }
+                f.write(json.dumps(entry) + "\n")
+                count += 1
+        logger.info(f"Wrote {count} batch requests to {path}")
+        return count
+
+    def _execute_batch_request(self, entry: Dict) -> Dict:
+        body = entry["body"]
+        content_tokens = len(
+            self.chunker.encoding.encode(body["messages"][-1]["content"])
         )
+        try:
+            completion = self.rate_limiter.make_request_with_retry(
+                client.chat.completions.create,
+                token_cost=self.system_tokens + content_tokens,
+                **body,
+            )
+        except Exception as e:
+            logger.error(f"Failed batch request {entry['custom_id']}: {str(e)}")
+            return {
+                "custom_id": entry["custom_id"],
+                "response": None,
+                "error": {"message": str(e)},
+            }
+        return {
+            "custom_id": entry["custom_id"],
+            "response": {"status_code": 200, "body": completion.model_dump()},
+            "error": None,
+        }
+
+    def execute_batch_requests(self, requests_path: str, results_path: str) -> int:
+        """Run a batch requests file against the configured client.
+
+        Writes a results file in the same format as a provider's batch
+        output, for testing against a local server. Returns the number of
+        failed requests.
+        """
+        failed = 0
+        with open(requests_path, "r") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, open(
+            results_path, "w"
+        ) as out:
+            futures = [
+                executor.submit(self._execute_batch_request, entry) for entry in entries
+            ]
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Running batch requests"
+            ):
+                result = future.result()
+                failed += result["error"] is not None
+                out.write(json.dumps(result) + "\n")
+        logger.info(f"Wrote {len(entries)} batch results to {results_path}")
+        return failed
+
+    def ingest_batch_results(
+        self, legislation_text: Union[str, TextIO], results_path: str
+    ) -> Legislation:
+        """Merge the chunk analyses of a batch results JSONL file.
+
+        Results exported from another document, or another version of this
+        one, are skipped.
+        """
+        document, _ = self._batch_document(legislation_text)
+        analyses: Dict[str, Dict] = {}
+        failed = set()
+        foreign = 0
+        with open(results_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                custom_id = entry["custom_id"]
+                try:
+                    result_document, position = self._parse_batch_custom_id(custom_id)
+                except (IndexError, ValueError):
+                    logger.error(f"Unrecognized custom ID {custom_id}")
+                    foreign += 1
+                    continue
+                if result_document != document:
+                    foreign += 1
+                    continue
+                response = entry.get("response") or {}
+                if entry.get("error") or response.get("status_code") != 200:
+                    failed.add(custom_id)
+                    continue
+                try:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                    analysis = Legislation.model_validate_json(content)
+                except Exception as e:
+                    logger.error(f"Unreadable result for {custom_id}: {str(e)}")
+                    failed.add(custom_id)
+                    continue
+                analyses[custom_id] = {"position": position, "analysis": analysis}
 
-        # Merge the results
-        for result in sorted_results:
-            analysis = result["analysis"]
-            merged.sections.extend(analysis.sections)
-            merged.definitions.extend(analysis.definitions)
-            merged.amendments.extend(analysis.amendments)
-
-            # Take the first non-empty value for single-value fields
-            if not merged.short_title and analysis.short_title:
-                merged.short_title = analysis.short_title
-            if not merged.table_of_contents and analysis.table_of_contents:
-                merged.table_of_contents = analysis.table_of_contents
-            if not merged.findings_or_purpose and analysis.findings_or_purpose:
-                merged.findings_or_purpose = analysis.findings_or_purpose
-            if (
-                not merged.authorization_of_appropriations
-                and analysis.authorization_of_appropriations
+        if foreign:
+            logger.warning(
+                f"Skipped {foreign} results that aren't for this document's chunks"
+            )
+        failed -= analyses.keys()  # Retried successfully
+        if failed:
+            logger.warning(f"Failed to process {len(failed)} chunks: {sorted(failed)}")
+        if not analyses:
+            raise Exception("No chunks were successfully processed")
+        logger.info(f"Ingested {len(analyses)} chunk analyses from {results_path}")
+        return self._merge_chunk_results(list(analyses.values()))
+
+    def _overview_tokens(self, overview: LegislationOverview) -> int:
+        return len(self.chunker.encoding.encode(overview.model_dump_json()))
+
+    def _fit_overview(
+        self, overview: LegislationOverview, max_tokens: int
+    ) -> LegislationOverview:
+        """Clip the fields of an overview too large to share a reduce request."""
+        encoding = self.chunker.encoding
+        field_tokens = max_tokens // len(LegislationOverview.model_fields)
+        while self._overview_tokens(overview) > max_tokens:
+            overview = LegislationOverview(
+                **{
+                    field: encoding.decode(encoding.encode(value)[:field_tokens])
+                    for field, value in overview.model_dump().items()
+                }
+            )
+            field_tokens //= 2
+        return overview
+
+    def _reduce_batches(
+        self, overviews: List[LegislationOverview]
+    ) -> List[List[LegislationOverview]]:
+        """Group consecutive overviews into batches that each fit one reduce request.
+
+        Every overview is clipped to half the input budget, so any two fit
+        together and each level at least halves the number of overviews.
+        """
+        budget = min(
+            profile.input_tokens(self.reduce_prompt_tokens),
+            MAX_CONTEXT_LENGTH - self.reduce_prompt_tokens - REDUCE_OUTPUT_TOKENS,
+        )
+        batches, batch, batch_tokens = [], [], 0
+        for overview in overviews:
+            overview = self._fit_overview(overview, budget // 2 - 8)
+            tokens = self._overview_tokens(overview) + 8  # "Part N:" label
+            if batch and (
+                len(batch) == self.reduce_fan_in or batch_tokens + tokens > budget
             ):
-                merged.authorization_of_appropriations = (
-                    analysis.authorization_of_appropriations
-                )
-            if not merged.effective_date and analysis.effective_date:
-                merged.effective_date = analysis.effective_date
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(overview)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _build_reduce_request(
+        self, batch: List[LegislationOverview]
+    ) -> tuple[Dict, int]:
+        content = "\n\n".join(
+            f"Part {i + 1}:\n{overview.model_dump_json()}"
+            for i, overview in enumerate(batch)
+        )
+        total_tokens = self.reduce_prompt_tokens + len(
+            self.chunker.encoding.encode(content)
+        )
+        request = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": REDUCE_PROMPT},
+                {"role": "user", "content": content},
+            ],
+            "response_format": LegislationOverview,
+            "max_tokens": REDUCE_OUTPUT_TOKENS,
+        }
+        return request, total_tokens
+
+    @staticmethod
+    def _combine_overviews(batch: List[LegislationOverview]) -> LegislationOverview:
+        """Take the first non-empty value of each field."""
+        return LegislationOverview(
+            **{
+                field: next((getattr(o, field) for o in batch if getattr(o, field)), "")
+                for field in LegislationOverview.model_fields
+            }
+        )
 
-        logger.info("Finished merging chunk results.")
-        return merged
+    def _reduce_result(
+        self, completions, batch: List[LegislationOverview]
+    ) -> LegislationOverview:
+        overview = completions.choices[0].message.parsed
+        if overview is None:
+            logger.warning("The model returned no parsed overview, keeping the first values")
+            return self._combine_overviews(batch)
+        return overview
+
+    def _reduce_batch(self, batch: List[LegislationOverview]) -> LegislationOverview:
+        """Combine one batch of overviews with a single request."""
+        if len(batch) == 1:
+            return batch[0]
+        request, total_tokens = self._build_reduce_request(batch)
+        try:
+            completions = self.rate_limiter.make_request_with_retry(
+                client.beta.chat.completions.parse,
+                token_cost=total_tokens,
+                **self._routed(request, total_tokens),
+            )
+        except Exception as e:
+            logger.error(f"Reduce request failed, keeping the first values: {str(e)}")
+            return self._combine_overviews(batch)
+        return self._reduce_result(completions, batch)
+
+    async def _reduce_batch_async(
+        self, batch: List[LegislationOverview]
+    ) -> LegislationOverview:
+        if len(batch) == 1:
+            return batch[0]
+        request, total_tokens = self._build_reduce_request(batch)
+        try:
+            completions = await self.rate_limiter.make_request_with_retry_async(
+                async_client.beta.chat.completions.parse,
+                token_cost=total_tokens,
+                **self._routed(request, total_tokens),
+            )
+        except Exception as e:
+            logger.error(f"Reduce request failed, keeping the first values: {str(e)}")
+            return self._combine_overviews(batch)
+        return self._reduce_result(completions, batch)
+
+    def _tree_reduce(
+        self, overviews: List[LegislationOverview]
+    ) -> Optional[LegislationOverview]:
+        """Reduce the chunk overviews level by level until one is left.
+
+        The batches of a level are reduced in parallel, so the run takes one
+        round of requests per level, log(chunks) / log(fan-in) in all.
+        """
+        started = time.perf_counter()
+        level = 0
+        while len(overviews) > 1:
+            batches = self._reduce_batches(overviews)
+            level += 1
+            logger.info(
+                f"Tree reduce level {level}: {len(overviews)} overviews in {len(batches)} batches"
+            )
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                overviews = list(executor.map(self._reduce_batch, batches))
+        metrics.inc(
+            "phase_seconds_total", time.perf_counter() - started, phase="tree_reduce"
+        )
+        return overviews[0] if overviews else None
+
+    async def _tree_reduce_async(
+        self, overviews: List[LegislationOverview]
+    ) -> Optional[LegislationOverview]:
+        """Async variant of _tree_reduce."""
+        semaphore = self.request_slots or asyncio.Semaphore(self.max_concurrency)
+
+        async def reduce_bounded(batch):
+            async with semaphore:
+                return await self._reduce_batch_async(batch)
+
+        started = time.perf_counter()
+        level = 0
+        while len(overviews) > 1:
+            batches = await asyncio.to_thread(self._reduce_batches, overviews)
+            level += 1
+            logger.info(
+                f"Tree reduce level {level}: {len(overviews)} overviews in {len(batches)} batches"
+            )
+            overviews = await asyncio.gather(*(reduce_bounded(b) for b in batches))
+        metrics.inc(
+            "phase_seconds_total", time.perf_counter() - started, phase="tree_reduce"
+        )
+        return overviews[0] if overviews else None
+
+    @staticmethod
+    def _apply_overview(merged: Legislation, overview: Optional[LegislationOverview]):
+        """Replace the merged document-level fields with the reduced ones."""
+        if overview is None:
+            return
+        for field in LegislationOverview.model_fields:
+            if getattr(overview, field):
+                setattr(merged, field, getattr(overview, field))
 
 
 # -----------------------------------------------------------
@@ -447,10 +2407,240 @@ class LegislationOrchestrator:
 # -----------------------------------------------------------
 
 
+async def analyze_legislation_warm(
+    orchestrator: LegislationOrchestrator, legislation_text: str, warm: bool
+) -> Legislation:
+    """Run the async engine, first opening a connection per request in flight if `warm`."""
+    if warm and isinstance(async_client, AsyncOpenAI):
+        await warm_connections_async(async_client, orchestrator.max_concurrency)
+    return await orchestrator.analyze_legislation_async(legislation_text)
+
+
 if __name__ == "__main__":
-    print("Legislation Reviewer Workflow Example")
+    parser = argparse.ArgumentParser(
+        description="Analyze a large piece of legislation in chunks."
+    )
+    parser.add_argument(
+        "--chunking",
+        choices=["tokens", "sections"],
+        default="tokens",
+        help="Cut overlapping fixed-size token windows, or pack whole sections",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="Dispatch chunk requests from a thread pool or from asyncio",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help=(
+            "Maximum in-flight chunk requests (derived from the model profile by default, "
+            f"or {ADAPTIVE_HEADROOM}x that with --adaptive-concurrency)"
+        ),
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=int,
+        default=None,
+        help="Request budget per minute (the model profile's, per server, by default)",
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=int,
+        default=TOKENS_PER_MINUTE,
+        help="Token budget per minute, unlimited if not set",
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="Adjust in-flight requests (up to --max-concurrency) from 429s and latency",
+    )
+    parser.add_argument(
+        "--cache-path",
+        help="SQLite cache of chunk analyses, e.g. .analysis_cache.sqlite (none by default)",
+    )
+    parser.add_argument(
+        "--token-cache",
+        metavar="DIR",
+        help="Directory caching the document's tokens between runs, e.g. .token_cache",
+    )
+    parser.add_argument(
+        "--invalidate-cache",
+        action="store_true",
+        help="Drop cached analyses made with the current prompt before the run",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Checkpoint file recording each chunk as it completes, e.g. legislation_analysis_manifest.jsonl",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Only re-dispatch chunks the manifest has no result for",
+    )
+    parser.add_argument(
+        "--previous-manifest",
+        help="Manifest of a run over an earlier version of the bill; only changed chunks are re-analyzed",
+    )
+    parser.add_argument(
+        "--chunk-output",
+        help="JSONL file each chunk's analysis is appended to as it completes, e.g. legislation_analysis_chunks.jsonl",
+    )
+    parser.add_argument(
+        "--tree-reduce",
+        action="store_true",
+        help="Combine the title, purpose and other document-level fields of all chunks with the model",
+    )
+    parser.add_argument(
+        "--reduce-fan-in",
+        type=int,
+        default=8,
+        help="Most chunk overviews combined by one tree-reduce request",
+    )
+    parser.add_argument(
+        "--export-batch",
+        metavar="PATH",
+        help="Write a JSONL batch of chat-completion requests, one per chunk, instead of sending them",
+    )
+    parser.add_argument(
+        "--execute-batch",
+        metavar="PATH",
+        help="Send the requests of a batch file to the configured server, writing --batch-results",
+    )
+    parser.add_argument(
+        "--batch-results",
+        default="legislation_batch_results.jsonl",
+        help="Results file written by --execute-batch",
+    )
+    parser.add_argument(
+        "--ingest-batch",
+        metavar="PATH",
+        help="Merge the chunk analyses of a batch results JSONL file instead of sending requests",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics at /metrics and a JSON snapshot at /metrics.json on this port",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        help="Write a JSON snapshot of the run's metrics here at the end, e.g. legislation_analysis_metrics.json",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream responses, merging sections as they are generated and stopping runaway generations",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=["document", "longest-first"],
+        default="document",
+        help="Dispatch chunks as they are cut, or the costliest first to shorten the tail of the run",
+    )
+    parser.add_argument(
+        "--split-extraction",
+        action="store_true",
+        help=(
+            "Extract the sections, the provisions and the legalese of each chunk in "
+            "concurrent requests. Triples the requests, so only worth trying when the "
+            "server has idle slots, on a document of fewer chunks than a third of "
+            "--max-concurrency"
+        ),
+    )
+    parser.add_argument(
+        "--base-url",
+        action="append",
+        help="Base URL of a server running the model; repeat to spread requests over several",
+    )
+    parser.add_argument(
+        "--backend",
+        action="append",
+        metavar="MODEL[=URL,...]",
+        help=(
+            "Route chunks between backends by latency and load, primary first. "
+            "Give a model of BACKEND_URLS, or a model and the comma-separated "
+            "URLs of the servers running it"
+        ),
+    )
+    parser.add_argument(
+        "--no-warm-up",
+        action="store_true",
+        help="Don't load the model and open connections before the document is chunked",
+    )
+    args = parser.parse_args()
+    if args.resume and not args.manifest:
+        parser.error("--resume needs the --manifest of the run to resume")
+    if args.invalidate_cache and not args.cache_path:
+        parser.error("--invalidate-cache needs --cache-path")
 
-    orchestrator = LegislationOrchestrator()
+    print("Legislation Reviewer Workflow Example")
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+    if args.base_url:
+        # Send each request to the least busy of the healthy servers
+        client = ClientPool(args.base_url)
+        async_client = client.asynchronous()
+        logger.info(f"{client.check_health()} of {len(client)} servers are healthy")
+    if args.backend:
+        backends = []
+        for spec in args.backend:
+            name, _, urls = spec.partition("=")
+            urls = urls.split(",") if urls else [BACKEND_URLS[name]]
+            # Only the hosted API gets the key, local servers don't need one
+            hosted = urls[0].startswith("https://api.openai.com")
+            pool = ClientPool(urls, api_key=api_key if hosted else "not-needed")
+            backends.append(Backend(name, pool, pool.asynchronous()))
+        client = BackendRouter(backends)
+        async_client = client.asynchronous()
+        # Chunks must fit every backend, and each backend keeps to its own budget
+        profile = client.profile
+        MAX_CONTEXT_LENGTH = profile.context_window
+        REQUESTS_PER_MINUTE = profile.requests_per_minute
+        TOKENS_PER_MINUTE = profile.tokens_per_minute
+        validation_rate_limiter = RateLimiter(requests_per_minute=REQUESTS_PER_MINUTE)
+        args.requests_per_minute = args.requests_per_minute or client.requests_per_minute()
+        args.tokens_per_minute = None
+    servers = len(args.base_url or [None])
+    args.requests_per_minute = args.requests_per_minute or REQUESTS_PER_MINUTE * servers
+
+    orchestrator = LegislationOrchestrator(
+        chunking=args.chunking,
+        max_concurrency=args.max_concurrency,
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        adaptive_concurrency=args.adaptive_concurrency,
+        cache_path=args.cache_path,
+        token_cache_dir=args.token_cache,
+        manifest_path=args.manifest,
+        resume=args.resume,
+        previous_manifest=args.previous_manifest,
+        chunk_output=args.chunk_output,
+        tree_reduce=args.tree_reduce,
+        reduce_fan_in=args.reduce_fan_in,
+        stream=args.stream,
+        schedule=args.schedule,
+        split_extraction=args.split_extraction,
+    )
+    if orchestrator.cache and args.invalidate_cache:
+        orchestrator.cache.invalidate()
+
+    warm = not args.no_warm_up and not args.ingest_batch
+    if warm:
+        warm_up(client, model)
+        if isinstance(client, OpenAI) and args.engine == "threads":
+            # One connection per worker, so no chunk request waits for a handshake
+            warm_connections(client, orchestrator.max_workers)
+
+    if args.execute_batch:
+        failed = orchestrator.execute_batch_requests(
+            args.execute_batch, args.batch_results
+        )
+        print(f"Batch results saved to {args.batch_results} ({failed} failed)")
+        raise SystemExit(0)
 
     # Load the document
     with open(
@@ -459,8 +2649,23 @@ if __name__ == "__main__":
     ) as f:
         legislation_text = f.read()
 
-    if validate_legislation(legislation_text[:4000]):  # Validate first chunk only
-        legislation_object = orchestrator.analyze_legislation(legislation_text)
+    if args.export_batch:
+        if validate_legislation(legislation_text[:4000]):
+            count = orchestrator.export_batch_requests(
+                legislation_text, args.export_batch
+            )
+            print(f"{count} batch requests saved to {args.export_batch}")
+    elif args.ingest_batch or validate_legislation(legislation_text[:4000]):
+        if args.ingest_batch:
+            legislation_object = orchestrator.ingest_batch_results(
+                legislation_text, args.ingest_batch
+            )
+        elif args.engine == "async":
+            legislation_object = asyncio.run(
+                analyze_legislation_warm(orchestrator, legislation_text, warm)
+            )
+        else:
+            legislation_object = orchestrator.analyze_legislation(legislation_text)
         result_json = legislation_object.model_dump_json(indent=2)
         print(f"Legislation Analysis Result:\n{result_json}")
         # Save to JSON file
@@ -468,3 +2673,10 @@ if __name__ == "__main__":
         with open(output_path, "w") as outfile:
             outfile.write(result_json)
         print(f"Analysis result saved to {output_path}")
+
+    if args.base_url or args.backend:
+        logger.info(f"Servers: {client.summary()}")
+    if args.metrics_json:
+        with open(args.metrics_json, "w") as f:
+            json.dump(metrics.snapshot(), f, indent=2)
+        print(f"Metrics saved to {args.metrics_json}")
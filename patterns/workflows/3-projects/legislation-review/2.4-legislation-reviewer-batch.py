@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import glob
+import importlib.util
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from analysis_store import AnalysisCache
+from rate_limiter import ConcurrencyController, RateLimiter
+
+HERE = Path(__file__).parent
+
+
+def load_reviewer():
+    """Import the chunking reviewer script as a module."""
+    spec = importlib.util.spec_from_file_location(
+        "legislation_reviewer_chunking", HERE / "2.3-legislation-reviewer-chunking.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# The reviewer sets up logging and the clients
+reviewer = load_reviewer()
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------
+# Step 1: Find the bills
+# -----------------------------------------------------------
+
+
+def find_bills(inputs: List[str]) -> List[Path]:
+    """Expand directories and glob patterns into a sorted list of bill files."""
+    paths = set()
+    for pattern in inputs:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.update(
+                p.resolve()
+                for p in path.iterdir()
+                if p.is_file() and p.suffix in (".md", ".txt")
+            )
+        else:
+            paths.update(
+                Path(p).resolve()
+                for p in glob.glob(pattern, recursive=True)
+                if Path(p).is_file()
+            )
+    return sorted(paths)
+
+
+def output_names(paths: List[Path]) -> Dict[Path, Path]:
+    """Name each bill's output files after its path under the directory all
+    the bills share, less its suffix, so bills/a/hr1.md and bills/b/hr1.md
+    get a/hr1 and b/hr1.
+
+    Raises ValueError if two bills would still share a name, like hr1.md
+    and hr1.txt.
+    """
+    root = Path(os.path.commonpath([path.parent for path in paths]))
+    names = {path: path.relative_to(root).with_suffix("") for path in paths}
+    by_name: Dict[Path, List[Path]] = {}
+    for path, name in names.items():
+        by_name.setdefault(name, []).append(path)
+    collisions = [sorted(same) for same in by_name.values() if len(same) > 1]
+    if collisions:
+        listed = "; ".join(", ".join(str(path) for path in same) for same in collisions)
+        raise ValueError(f"Bills would overwrite each other's results: {listed}")
+    return names
+
+
+# -----------------------------------------------------------
+# Step 2: Validate and chunk bills in worker processes
+# -----------------------------------------------------------
+"""Tokenizing is CPU-bound, so each worker process cuts whole bills on its own core.
+The workers only score bills locally. Bills the score can't decide are sent to
+the model by the main process, through the rate limiter every request shares."""
+
+splitter = None  # Set in each worker process
+
+
+def init_worker(chunking: str):
+    global splitter
+    logging.getLogger(reviewer.__name__).setLevel(logging.WARNING)
+    # Chunk exactly as the orchestrator that will analyze the chunks would
+    splitter = reviewer.LegislationOrchestrator(chunking=chunking).splitter
+
+
+def prepare_bill(path: str) -> Dict:
+    """Score a bill and cut it into chunks.
+
+    "valid" is None if the model has to decide.
+    """
+    started = time.perf_counter()
+    text = Path(path).read_text()
+    before = Counter(reviewer.validation_stats)
+    valid = reviewer.validate_locally(text[:4000])  # Validate first chunk only
+    # How this bill was validated, summed up in the main process
+    validation = dict(reviewer.validation_stats - before)
+    if valid is False:
+        return {"path": path, "valid": False, "validation": validation}
+    # Plain tuples, so the result pickles without the reviewer's classes
+    chunks = [tuple(chunk) for chunk in splitter.create_chunks(text)]
+    return {
+        "path": path,
+        "valid": valid,
+        "text": text,
+        "chunks": chunks,
+        "validation": validation,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+# -----------------------------------------------------------
+# Step 3: Analyze the bills on one shared scheduler
+# -----------------------------------------------------------
+
+
+async def review_bills(names: Dict[Path, Path], args: argparse.Namespace) -> Counter:
+    """Analyze every bill, writing one result file per bill to args.output_dir.
+
+    `names` maps each bill's path to the name of its files, from output_names().
+
+    All bills share one RateLimiter and one bound on requests in flight, so
+    request throughput is set by the rate budget however many bills are open.
+    """
+    controller = (
+        ConcurrencyController(
+            initial=args.initial_concurrency, maximum=args.max_concurrency
+        )
+        if args.adaptive_concurrency
+        else None
+    )
+    rate_limiter = RateLimiter(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        controller=controller,
+    )
+    request_slots = asyncio.Semaphore(args.max_concurrency)
+    cache = (
+        AnalysisCache(
+            args.cache_path,
+            reviewer.model,
+            reviewer.ORCHESTRATOR_PROMPT,
+            reviewer.Legislation,
+        )
+        if args.cache_path
+        else None
+    )
+    # Bills prepared or being analyzed. Keeps the pool a little ahead of the
+    # requests without holding every chunked bill in memory.
+    bills_in_flight = asyncio.Semaphore(2 * args.workers)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    stats = Counter()
+
+    async def review(path: Path, pool: ProcessPoolExecutor):
+        output = output_dir / names[path]
+        output.parent.mkdir(parents=True, exist_ok=True)
+        result_path = Path(f"{output}.json")
+        if args.resume and result_path.exists():
+            stats["skipped"] += 1
+            return
+
+        async with bills_in_flight:
+            try:
+                bill = await loop.run_in_executor(pool, prepare_bill, str(path))
+            except Exception as e:
+                logger.error(f"Failed to prepare {path}: {str(e)}")
+                stats["failed"] += 1
+                return
+            reviewer.validation_stats.update(bill["validation"])
+            if bill["valid"] is None:
+                try:
+                    async with request_slots:
+                        bill["valid"] = await reviewer.validate_with_model_async(
+                            bill["text"][:4000], rate_limiter
+                        )
+                except Exception as e:
+                    logger.error(f"Failed to validate {path}: {str(e)}")
+                    stats["failed"] += 1
+                    return
+            if not bill["valid"]:
+                logger.warning(f"Skipping {path}: not legislation")
+                stats["invalid"] += 1
+                return
+            stats["preparation_seconds"] += bill["seconds"]
+
+            orchestrator = reviewer.LegislationOrchestrator(
+                chunking=args.chunking,
+                max_concurrency=args.max_concurrency,
+                manifest_path=f"{output}.manifest.jsonl",
+                resume=args.resume,
+                chunk_output=f"{output}.chunks.jsonl",
+                tree_reduce=args.tree_reduce,
+                rate_limiter=rate_limiter,
+                request_slots=request_slots,
+            )
+            orchestrator.cache = cache
+            chunks = [reviewer.TextChunk(*chunk) for chunk in bill["chunks"]]
+            try:
+                legislation = await orchestrator.analyze_legislation_async(
+                    bill["text"], chunks=chunks
+                )
+            except Exception as e:
+                logger.error(f"Failed to review {path}: {str(e)}")
+                stats["failed"] += 1
+                return
+
+            result_path.write_text(legislation.model_dump_json(indent=2))
+            stats["reviewed"] += 1
+            stats["chunks"] += len(chunks)
+            logger.info(f"Reviewed {path} ({len(chunks)} chunks), saved to {result_path}")
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=init_worker,
+        initargs=(args.chunking,),
+    ) as pool:
+        await asyncio.gather(*(review(path, pool) for path in names))
+
+    if controller:
+        logger.info(f"Adaptive concurrency: {controller.summary()}")
+    if cache:
+        logger.info(f"Analysis cache: {cache.stats()}")
+    return stats
+
+
+# -----------------------------------------------------------
+# Step 4: Example usage
+# -----------------------------------------------------------
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analyze a directory of bills with the chunking legislation reviewer."
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Directories of .md/.txt bills, or glob patterns such as 'bills/**/*.md'",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="legislation_analysis_results",
+        help="Directory for the per-bill results, chunk analyses and manifests",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes validating and chunking bills",
+    )
+    parser.add_argument(
+        "--chunking",
+        choices=["tokens", "sections"],
+        default="tokens",
+        help="Cut overlapping fixed-size token windows, or pack whole sections",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="Most requests in flight across all bills (derived from the model profile by default)",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=int,
+        default=None,
+        help="Request budget shared by all bills (the model profile's, per server, by default)",
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=int,
+        default=reviewer.TOKENS_PER_MINUTE,
+        help="Prompt token budget shared by all bills (unlimited by default)",
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="Find the in-flight limit from 429s and latency, up to --max-concurrency",
+    )
+    parser.add_argument(
+        "--cache-path",
+        help="SQLite cache of chunk analyses shared by all bills (none by default)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip bills that have a result and resume the others from their manifests",
+    )
+    parser.add_argument(
+        "--tree-reduce",
+        action="store_true",
+        help="Combine the title, purpose and other document-level fields of all chunks with the model",
+    )
+    parser.add_argument(
+        "--base-url",
+        action="append",
+        help="Base URL of a server running the model; repeat to spread requests over several",
+    )
+    args = parser.parse_args()
+    args.workers = max(args.workers or 1, 1)
+    if args.base_url:
+        reviewer.client = reviewer.ClientPool(args.base_url)
+        reviewer.async_client = reviewer.client.asynchronous()
+        logger.info(
+            f"{reviewer.client.check_health()} of {len(args.base_url)} servers are healthy"
+        )
+    servers = len(args.base_url or [None])
+    default_concurrency = reviewer.profile.concurrency() * servers
+    if args.adaptive_concurrency and not args.max_concurrency:
+        # The controller starts at the profile's figure and may find the servers take more
+        args.max_concurrency = default_concurrency * reviewer.ADAPTIVE_HEADROOM
+    args.max_concurrency = args.max_concurrency or default_concurrency
+    args.initial_concurrency = min(default_concurrency, args.max_concurrency)
+    args.requests_per_minute = (
+        args.requests_per_minute or reviewer.REQUESTS_PER_MINUTE * servers
+    )
+
+    paths = find_bills(args.inputs)
+    if not paths:
+        parser.error(f"No bills found in {' '.join(args.inputs)}")
+    try:
+        names = output_names(paths)
+    except ValueError as e:
+        parser.error(str(e))
+    logging.getLogger(reviewer.__name__).setLevel(logging.WARNING)
+    logger.info(f"Reviewing {len(paths)} bills with {args.workers} worker processes")
+
+    started = time.monotonic()
+    stats = asyncio.run(review_bills(names, args))
+    elapsed = time.monotonic() - started
+
+    print(
+        f"Reviewed {stats['reviewed']} of {len(paths)} bills in {elapsed:.1f}s "
+        f"({stats['invalid']} not legislation, {stats['failed']} failed, "
+        f"{stats['skipped']} already done)"
+    )
+    print(
+        f"{stats['chunks']} chunks, {stats['chunks'] / elapsed:.1f} chunks/s, "
+        f"{stats['preparation_seconds']:.1f}s of validation and chunking in worker processes"
+    )
+    print(f"Validation: {reviewer.validation_report(reviewer.validation_stats)}")
+    print(f"Results saved to {args.output_dir}")
@@ -0,0 +1,327 @@
+"""
+Persistent stores for the per-chunk results of an LLM pipeline.
+
+AnalysisCache keeps parsed analyses in SQLite across runs, RunManifest
+checkpoints a run to JSONL so it can be resumed or its analyses reused by a
+run over an edited document, and ChunkResultSink streams each chunk's
+result to JSONL as it completes. All three take the Pydantic model the
+analyses are parsed into, and chunks with a `text` and a `position`.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """Persistent SQLite cache of parsed chunk analyses.
+
+    Entries are keyed by a hash of the model that served the analysis, the
+    prompt, chunk text and the JSON schema of response_model, so any change
+    to those misses. Requests routed between backends are cached under the model of
+    the backend that answered, and looked up under any of the models they
+    could be routed to. The cache is
+    capped at max_bytes of stored results, evicting the least recently used
+    entries, and every entry records the prompt version it was made with so
+    it can be invalidated when the prompt changes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        prompt: str,
+        response_model: type[BaseModel],
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.model_name = model_name
+        self.prompt = prompt
+        self.prompt_version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        self.response_model = response_model
+        self.schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS analyses (
+                    key TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used)"
+            )
+
+    def key_for(self, chunk_text: str, model_name: str = None) -> str:
+        key_prefix = json.dumps([model_name or self.model_name, self.prompt, self.schema])
+        digest = hashlib.sha256(key_prefix.encode("utf-8"))
+        digest.update(chunk_text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, chunk_text: str, model_name: str = None) -> Optional[BaseModel]:
+        """Return the cached analysis of a chunk, or None on a miss."""
+        analysis, _ = self.lookup(chunk_text, [model_name or self.model_name])
+        return analysis
+
+    def lookup(
+        self, chunk_text: str, model_names: Sequence[str]
+    ) -> tuple[Optional[BaseModel], Optional[str]]:
+        """Return the cached analysis of a chunk by the first of `model_names`
+        that has one, and that model, or (None, None) on a miss."""
+        with self.lock, self.connection:
+            for model_name in model_names:
+                key = self.key_for(chunk_text, model_name)
+                row = self.connection.execute(
+                    "SELECT result FROM analyses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    break
+            else:
+                self.misses += 1
+                return None, None
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return self.response_model.model_validate_json(row[0]), model_name
+
+    def put(self, chunk_text: str, analysis: BaseModel, model_name: str = None):
+        """Store the analysis of a chunk, evicting old entries past the size cap."""
+        # None values are left out so they fall back to the models' None defaults
+        result = analysis.model_dump_json(exclude_none=True)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?)",
+                (
+                    self.key_for(chunk_text, model_name),
+                    self.prompt_version,
+                    result,
+                    len(result),
+                    time.time(),
+                ),
+            )
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        (total,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM analyses"
+        ).fetchone()
+        while total > self.max_bytes:
+            key, size = self.connection.execute(
+                "SELECT key, size FROM analyses ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            self.connection.execute("DELETE FROM analyses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self, prompt_version: str = None) -> int:
+        """Delete the entries made with one prompt version (the current one by default)."""
+        with self.lock, self.connection:
+            deleted = self.connection.execute(
+                "DELETE FROM analyses WHERE prompt_version = ?",
+                (prompt_version or self.prompt_version,),
+            ).rowcount
+        logger.info(f"Invalidated {deleted} cached analyses")
+        return deleted
+
+    def stats(self) -> Dict:
+        with self.lock:
+            entries, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+class RunManifest:
+    """Append-only JSONL checkpoint of a chunked run.
+
+    The first line describes the run (document hash, model, prompt version and
+    chunking settings); every following line records one chunk as "done",
+    with its parsed analysis and the model that served it, or "failed", with
+    the error. Lines are flushed
+    as chunks complete, so a crashed run can be resumed from the file.
+    """
+
+    def __init__(self, path: str, run: Dict, response_model: type[BaseModel]):
+        self.path = Path(path)
+        self.run = run
+        self.response_model = response_model
+        self.file = None
+
+    def _read_completed(self) -> Dict[int, BaseModel]:
+        """Return {position: analysis} for every chunk the manifest records as done."""
+        completed = {}
+        with open(self.path, "r") as f:
+            lines = iter(f)
+            header = json.loads(next(lines, "{}"))
+            if header.get("run") != self.run:
+                logger.warning(
+                    f"Manifest {self.path} is for a different run, starting over"
+                )
+                return {}
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash, later runs may have appended more
+                    logger.warning(f"Skipping a torn line in manifest {self.path}")
+                    continue
+                if entry["status"] == "done":
+                    completed[entry["position"]] = self.response_model.model_validate(
+                        entry["analysis"]
+                    )
+                else:
+                    completed.pop(entry["position"], None)
+        return completed
+
+    def open(self, resume: bool = False) -> Dict[int, BaseModel]:
+        """Open the manifest for writing, returning the chunks already done when resuming."""
+        completed = {}
+        if resume and self.path.exists():
+            completed = self._read_completed()
+            logger.info(f"Resuming run, {len(completed)} chunks already done")
+
+        if completed:
+            self._drop_torn_line()
+            self.file = open(self.path, "a")
+        else:
+            self.file = open(self.path, "w")
+            self._write({"run": self.run})
+        return completed
+
+    def _drop_torn_line(self):
+        """Cut off a last line a crash left without its newline, so the next
+        record starts on a line of its own instead of being glued onto it."""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _write(self, entry: Dict):
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    @staticmethod
+    def chunk_hash(chunk_text: str) -> str:
+        return hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def load_chunk_analyses(
+        path: str, response_model: type[BaseModel], model_names: Sequence[str] = None
+    ) -> Dict[str, tuple[BaseModel, Optional[str]]]:
+        """Return {chunk hash: (analysis, model)} for every completed chunk of
+        any run, only those served by one of `model_names` if given."""
+        analyses = {}
+        with open(path, "r") as f:
+            try:
+                header = json.loads(next(f, "{}"))
+            except json.JSONDecodeError:
+                header = {}
+            # Chunks recorded without their model were served by the run's
+            run_model = header.get("run", {}).get("model")
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping a torn line in manifest {path}")
+                    continue
+                served_by = entry.get("model", run_model)
+                if model_names and served_by not in model_names:
+                    continue
+                if entry["status"] == "done" and "chunk_hash" in entry:
+                    analyses[entry["chunk_hash"]] = (
+                        response_model.model_validate(entry["analysis"]),
+                        served_by,
+                    )
+        return analyses
+
+    def record_done(self, index: int, chunk, analysis: BaseModel, model_name: str = None):
+        self._write(
+            {
+                "index": index,
+                "position": chunk.position,
+                "chunk_hash": self.chunk_hash(chunk.text),
+                "status": "done",
+                "model": model_name,
+                "analysis": analysis.model_dump(exclude_none=True),
+            }
+        )
+
+    def record_failed(self, index: int, chunk, error: Exception):
+        self._write(
+            {
+                "index": index,
+                "position": chunk.position,
+                "chunk_hash": self.chunk_hash(chunk.text),
+                "status": "failed",
+                "error": str(error),
+            }
+        )
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class ChunkResultSink:
+    """Appends each chunk's analysis to a JSONL file as soon as it comes back.
+
+    Lines are written in completion order and carry the chunk index and
+    position, so a consumer can start on early sections while the run goes on.
+    With streaming, each section also gets a line of its own as soon as it is
+    generated, ahead of its chunk's analysis.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.file = open(self.path, "w")
+
+    def write_section(self, index: int, chunk, section: BaseModel):
+        entry = {
+            "index": index,
+            "position": chunk.position,
+            "section": section.model_dump(exclude_none=True),
+        }
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    def write(self, index: int, chunk, analysis: BaseModel):
+        entry = {
+            "index": index,
+            "position": chunk.position,
+            "analysis": analysis.model_dump(exclude_none=True),
+        }
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,284 @@
+"""
+Benchmark the chunking reviewer end to end against the simulated server.
+
+Runs the full 2.3 pipeline on legislation.md: validation, chunking, chunk
+requests, merge and the result JSON. The OpenAI clients are swapped for
+StandInClients over a SimulatedServer, so no network or model is involved and
+a fixed seed gives repeatable runs. Reports chunking time, end-to-end wall
+time, requests per second, request latency percentiles and peak RSS.
+
+With --servers above 1 the requests go through a ClientPool over that many
+simulated servers, and --down-servers of them refuse connections, to show
+throughput scaling with the pool and the pool draining dead servers.
+
+With --secondary-latency the requests go through a BackendRouter with a
+second, differently sized backend behind the first, to show chunks spilling
+over from a saturated primary and the split following each backend's latency.
+
+With --stream the responses are streamed and sections merged as they arrive.
+The report then compares the mean time to a chunk's first section with the
+mean time to its whole analysis, and --runaway-probability makes a share of
+responses run away to show them being cut off.
+
+With --token-latency each response takes longer the more it has to say, so
+chunk costs differ, and --schedule longest-first dispatches the costliest
+chunks first. The report adds the run's makespan, from the first chunk
+request to the last result, and its tail, the time the last tenth of requests
+took to finish, which is where a long chunk dispatched late shows.
+
+With --split-extraction each chunk's sections, provisions and legalese are
+requested concurrently, and the report's mean chunk analysis time shows
+whether the shorter parallel responses beat one long one. With more chunks
+than free slots the tripled requests just queue, so try it on a short
+--input.
+
+    python benchmark-legislation-pipeline.py [--engine async] [--capacity 8]
+        [--latency-distribution lognormal] [--rate-limit-probability 0.05]
+        [--servers 4] [--down-servers 1] [--stream] [--runaway-probability 0.1]
+        [--secondary-latency 0.5 --secondary-capacity 4]
+        [--token-latency 0.001 --schedule longest-first] [--split-extraction]
+
+Peak RSS covers the whole process, so compare engines in separate runs.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from client_pool import Backend, BackendRouter, ClientPool, Endpoint
+from llm_metrics import metrics
+
+HERE = Path(__file__).parent
+
+
+def load_script(name: str, filename: str):
+    """Import one of the hyphen-named scripts in this directory as a module."""
+    spec = importlib.util.spec_from_file_location(name, HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", type=str, default=str(HERE / "legislation.md"))
+    parser.add_argument("--engine", choices=["threads", "async"], default="async")
+    parser.add_argument("--chunking", choices=["tokens", "sections"], default="tokens")
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--adaptive-concurrency", action="store_true")
+    parser.add_argument("--requests-per-minute", type=int, default=60000)
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--queue-limit", type=int, default=None)
+    parser.add_argument("--base-latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument(
+        "--latency-distribution",
+        choices=["uniform", "lognormal", "exponential", "constant"],
+        default="uniform",
+    )
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--servers", type=int, default=1)
+    parser.add_argument("--down-servers", type=int, default=0)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--runaway-probability", type=float, default=0.0)
+    parser.add_argument("--secondary-latency", type=float, default=None)
+    parser.add_argument("--secondary-capacity", type=int, default=4)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument(
+        "--schedule", choices=["document", "longest-first"], default="document"
+    )
+    parser.add_argument("--split-extraction", action="store_true")
+    args = parser.parse_args()
+
+    reviewer = load_script(
+        "legislation_reviewer_chunking", "2.3-legislation-reviewer-chunking.py"
+    )
+    simulator = load_script("simulated_llm_server", "simulated-llm-server.py")
+    logging.disable(logging.WARNING)
+
+    servers = [
+        simulator.SimulatedServer(
+            capacity=args.capacity,
+            base_latency=args.base_latency,
+            queue_limit=args.queue_limit,
+            jitter=args.jitter,
+            seed=args.seed + i,
+            distribution=args.latency_distribution,
+            rate_limit_probability=args.rate_limit_probability,
+            runaway_probability=args.runaway_probability,
+            token_latency=args.token_latency,
+        )
+        for i in range(args.servers)
+    ]
+    for server in servers[: args.down_servers]:
+        server.up = False
+    if args.servers == 1:
+        reviewer.client = simulator.StandInClient(servers[0])
+        reviewer.async_client = simulator.StandInClient(servers[0], asynchronous=True)
+    else:
+        reviewer.client = ClientPool(
+            [
+                Endpoint(
+                    f"simulated://{i}",
+                    client=simulator.StandInClient(server),
+                    async_client=simulator.StandInClient(server, asynchronous=True),
+                )
+                for i, server in enumerate(servers)
+            ]
+        )
+        reviewer.async_client = reviewer.client.asynchronous()
+
+    if args.secondary_latency:
+        secondary = simulator.SimulatedServer(
+            capacity=args.secondary_capacity,
+            base_latency=args.secondary_latency,
+            jitter=args.jitter,
+            seed=args.seed + args.servers,
+            distribution=args.latency_distribution,
+            rate_limit_probability=args.rate_limit_probability,
+            runaway_probability=args.runaway_probability,
+            token_latency=args.token_latency,
+        )
+        # Simulated backends take as many requests as the benchmark sends
+        primary_profile = reviewer.profile.model_copy(
+            update={"requests_per_minute": args.requests_per_minute}
+        )
+        secondary_profile = primary_profile.model_copy(
+            update={"name": "secondary", "parallel_requests": args.secondary_capacity}
+        )
+        reviewer.client = BackendRouter(
+            [
+                Backend(
+                    reviewer.model,
+                    reviewer.client,
+                    reviewer.async_client,
+                    profile=primary_profile,
+                ),
+                Backend(
+                    "secondary",
+                    simulator.StandInClient(secondary),
+                    simulator.StandInClient(secondary, asynchronous=True),
+                    profile=secondary_profile,
+                ),
+            ]
+        )
+        reviewer.async_client = reviewer.client.asynchronous()
+        servers.append(secondary)
+
+    orchestrator = reviewer.LegislationOrchestrator(
+        chunking=args.chunking,
+        max_concurrency=args.max_concurrency,
+        requests_per_minute=args.requests_per_minute,
+        adaptive_concurrency=args.adaptive_concurrency,
+        stream=args.stream,
+        schedule=args.schedule,
+        split_extraction=args.split_extraction,
+    )
+    # Retry rejected requests on the simulator's time scale
+    orchestrator.rate_limiter.retry_intervals = [
+        args.base_latency * 2**attempt for attempt in range(5)
+    ]
+    reviewer.validation_rate_limiter.retry_intervals = (
+        orchestrator.rate_limiter.retry_intervals
+    )
+
+    text = Path(args.input).read_text()
+    started = time.perf_counter()
+    chunks = list(orchestrator.splitter.create_chunks(text))
+    chunking_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if not reviewer.validate_legislation(text[:4000]):
+        sys.exit("The input did not validate as legislation")
+    analysis_started = time.monotonic()
+    if args.engine == "async":
+        legislation = asyncio.run(orchestrator.analyze_legislation_async(text))
+    else:
+        legislation = orchestrator.analyze_legislation(text)
+    result_json = legislation.model_dump_json(indent=2)
+    wall_time = time.perf_counter() - started
+    completed = sum(server.completed for server in servers)
+    rejected = sum(server.rejected for server in servers)
+    latencies = [latency for server in servers for latency in server.latencies]
+    finished_at = sorted(t for server in servers for t in server.finished_at)
+
+    print(f"Input: {args.input} ({len(text):,} chars)")
+    print(
+        f"Servers: {args.servers} ({args.down_servers} down), capacity {servers[0].capacity}, "
+        f"queue limit {servers[0].queue_limit}, {args.latency_distribution} latency around "
+        f"{servers[0].base_latency}s plus {args.token_latency * 1000:g} ms per token, "
+        f"{args.rate_limit_probability:.0%} injected 429s"
+    )
+    print(
+        f"Pipeline: {args.engine} engine, {args.chunking} chunking, "
+        f"{orchestrator.max_concurrency} max in flight, {args.schedule} schedule"
+        f"{', streaming' if args.stream else ''}"
+        f"{', split extraction' if args.split_extraction else ''}"
+    )
+    print(
+        f"Chunking: {len(chunks)} chunks of up to {orchestrator.chunker.chunk_size} "
+        f"tokens in {chunking_time * 1000:.1f} ms"
+    )
+    print(
+        f"End to end: {wall_time:.2f}s, {completed} requests "
+        f"({completed / wall_time:.1f} req/s), {rejected} rejected with 429"
+    )
+    if latencies:
+        print(
+            f"Request latency: median {statistics.median(latencies):.3f}s, "
+            f"p95 {percentile(latencies, 0.95):.3f}s, "
+            f"max {max(latencies):.3f}s"
+        )
+        makespan = finished_at[-1] - analysis_started
+        tail = finished_at[-1] - finished_at[int(0.9 * (len(finished_at) - 1))]
+        print(
+            f"Makespan: {makespan:.2f}s, the last 10% of requests finished "
+            f"over the final {tail:.2f}s"
+        )
+    analysis = metrics.snapshot()["histograms"].get("chunk_analysis_seconds")
+    if analysis:
+        print(f"Chunk analysis: mean {analysis['sum'] / analysis['count']:.3f}s")
+    if args.secondary_latency:
+        print(f"Router: {reviewer.client.summary()}")
+    elif args.servers > 1:
+        print(f"Pool: {reviewer.client.summary()}")
+    if args.stream:
+        snapshot = metrics.snapshot()
+        histograms = snapshot["histograms"]
+        first_section = histograms.get("chunk_first_section_seconds")
+        analysis = histograms["chunk_analysis_seconds"]
+        aborted = sum(
+            value
+            for name, value in snapshot["counters"].items()
+            if name.startswith("llm_streams_aborted_total")
+        )
+        if first_section:
+            print(
+                f"Streaming: first section after {first_section['sum'] / first_section['count']:.3f}s "
+                f"on average, whole analysis after {analysis['sum'] / analysis['count']:.3f}s, "
+                f"{aborted:.0f} runaway responses stopped"
+            )
+    print(
+        f"Result: {len(legislation.sections)} sections, "
+        f"{len(result_json.encode('utf-8')) / 1024:.0f} KB JSON"
+    )
+    print(f"Peak RSS: {peak_rss_mb():.0f} MB")
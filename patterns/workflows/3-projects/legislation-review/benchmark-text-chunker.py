@@ -0,0 +1,171 @@
+"""
+Benchmark TextChunker.create_chunks against the decode/rfind/re-encode chunking loop.
+
+Runs the original chunking loop, the same loop with the current chunking
+rules, and TextChunker.create_chunks over legislation.md. It checks that the
+last two produce the same chunks and reports chunking throughput against the
+original, plus a run served from the token cache.
+
+    python benchmark-text-chunker.py [--repeat 5] [--chunk-size 5000]
+
+The chunk size defaults to the one the reviewer uses for its model profile.
+"""
+
+import argparse
+import importlib.util
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+HERE = Path(__file__).parent
+logger = logging.getLogger(__name__)
+
+
+def load_reviewer():
+    """Import the chunking reviewer script as a module."""
+    spec = importlib.util.spec_from_file_location(
+        "legislation_reviewer_chunking", HERE / "2.3-legislation-reviewer-chunking.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def baseline_create_chunks(chunker, text: str) -> Iterator[tuple[str, int]]:
+    """TextChunker.create_chunks before the token offset map, as it was."""
+    tokens = chunker.encoding.encode(text)
+
+    logger.info(f"Total tokens in text: {len(tokens)}")
+    if len(tokens) < chunker.chunk_size:
+        logger.info("Text fits in single chunk")
+        yield text, 0
+        return
+
+    start = 0
+    logger.info("Creating text chunks...")
+    while start < len(tokens):
+        # Calculate end position
+        end = start + min(chunker.chunk_size, len(tokens) - start)
+        chunk_tokens = tokens[start:end]
+        chunk_text = chunker.encoding.decode(chunk_tokens)
+
+        # Find a good breaking point
+        if len(chunk_text) > 100:
+            last_period = chunk_text.rfind(". ")
+            if last_period != -1:
+                chunk_text = chunk_text[: last_period + 1]
+                # Recalculate tokens for accurate positioning
+                chunk_tokens = chunker.encoding.encode(chunk_text)
+
+        logger.info(f"Created chunk with {len(chunk_tokens)} tokens")
+        yield chunk_text, start
+
+        # Update start position
+        next_start = start + len(chunk_tokens) - chunker.overlap
+        if next_start <= start:
+            next_start = start + 1
+        start = next_start
+        logger.info(f"Next chunk will start at token index {start}...")
+    logger.info("Finished creating text chunks.")
+
+
+def reference_create_chunks(chunker, text: str) -> Iterator[tuple[str, int]]:
+    """The baseline's decode/rfind/re-encode loop with the current chunking rules.
+
+    Unlike the baseline it only cuts at a period in the back half of a
+    slice, leaves the last slice whole, and stops at the chunk that reaches
+    the end instead of going on through the overlap a token at a time.
+    TextChunker.create_chunks must produce exactly its chunks.
+    """
+    tokens = chunker.encoding.encode(text)
+    if len(tokens) < chunker.chunk_size:
+        yield text, 0
+        return
+
+    start = 0
+    while start < len(tokens):
+        end = start + min(chunker.chunk_size, len(tokens) - start)
+        chunk_tokens = tokens[start:end]
+        chunk_text = chunker.encoding.decode(chunk_tokens)
+        if len(chunk_text) > 100 and end < len(tokens):
+            last_period = chunk_text.rfind(". ", len(chunk_text) // 2)
+            if last_period != -1:
+                chunk_text = chunk_text[: last_period + 1]
+                chunk_tokens = chunker.encoding.encode(chunk_text)
+        yield chunk_text, start
+        if start + len(chunk_tokens) >= len(tokens):
+            break
+        start += max(len(chunk_tokens) - chunker.overlap, 1)
+
+
+def best_time(func: Callable[[], List], repeat: int) -> tuple[float, List]:
+    """Return the fastest of `repeat` runs and the result of the last one."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--input", type=str, default=str(HERE / "legislation.md"))
+    args = parser.parse_args()
+
+    reviewer = load_reviewer()
+    logging.disable(logging.INFO)
+
+    text = Path(args.input).read_text()
+    # What the orchestrator fills: the context window less the response and the prompt
+    encoding = reviewer.tiktoken.encoding_for_model("gpt-4o")
+    args.chunk_size = args.chunk_size or reviewer.profile.input_tokens(
+        len(encoding.encode(reviewer.ORCHESTRATOR_PROMPT))
+    )
+    chunker = reviewer.TextChunker(chunk_size=args.chunk_size)
+    total_tokens = len(chunker.encoding.encode(text))
+    chunker._token_byte_lengths()  # Built once per process, keep it out of the timings
+
+    baseline_time, baseline_chunks = best_time(
+        lambda: list(baseline_create_chunks(chunker, text)), args.repeat
+    )
+    reference_time, reference_chunks = best_time(
+        lambda: list(reference_create_chunks(chunker, text)), args.repeat
+    )
+    offset_time, offset_chunks = best_time(
+        lambda: list(chunker.create_chunks(text)), args.repeat
+    )
+    if [(c.text, c.position) for c in offset_chunks] != reference_chunks:
+        print("WARNING: chunkers produced different chunks")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cached_chunker = reviewer.TextChunker(
+            chunk_size=args.chunk_size, cache_dir=cache_dir
+        )
+        list(cached_chunker.create_chunks(text))  # Populate the cache
+        cached_time, _ = best_time(
+            lambda: list(cached_chunker.create_chunks(text)), args.repeat
+        )
+
+    print(f"Input: {args.input} ({len(text):,} chars, {total_tokens:,} tokens)")
+    print(
+        f"Chunks: {len(offset_chunks)} of up to {chunker.chunk_size} tokens "
+        f"({len(baseline_chunks)} from the baseline loop)"
+    )
+    for name, seconds in [
+        ("baseline loop", baseline_time),
+        ("baseline loop, current rules", reference_time),
+        ("token offset map", offset_time),
+        ("token offset map, cached", cached_time),
+    ]:
+        print(
+            f"{name:<30} {seconds * 1000:8.1f} ms  "
+            f"{total_tokens / seconds / 1e6:6.2f} M tokens/s  "
+            f"{baseline_time / seconds:5.2f}x"
+        )
@@ -0,0 +1,511 @@
+"""
+Spread requests over several OpenAI-compatible inference servers and backends.
+
+ClientPool takes the base URLs of servers that serve the same model, such as
+a few LM Studio or llama.cpp boxes, and sends each request to the healthy
+server with the fewest requests outstanding. A server whose requests fail to
+connect or come back with a 5xx is drained: it gets no new requests, the ones
+it is working on finish, and it rejoins once a probe of its /models endpoint
+succeeds.
+
+BackendRouter sits one level up, over backends serving different models,
+such as a hosted model, a LAN box and a local server. Each request goes to
+the backend expected to answer first from its rolling latency and queue
+depth. A backend that is saturated, out of its rate budget or answering with
+429s is passed over for the next one.
+
+Both offer the parts of the OpenAI client interface the scripts call, so
+either can take the place of `client` or `async_client`.
+"""
+
+import copy
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from functools import partial
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+import llm_health
+from model_profiles import ModelProfile, get_profile
+
+logger = logging.getLogger(__name__)
+
+# Failures of the server rather than of the request. Requests failing this way
+# are sent to another server.
+ENDPOINT_ERRORS = (APIConnectionError, InternalServerError, ConnectionError, TimeoutError)
+
+# Client methods the pool forwards, by the name it forwards them under
+OPERATIONS: Dict[str, Callable] = {
+    "create": lambda client: client.chat.completions.create,
+    "parse": lambda client: client.beta.chat.completions.parse,
+}
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether a request was rejected with a 429."""
+    return isinstance(error, RateLimitError) or "429" in str(error)
+
+
+class TrackedStream:
+    """Passes a streamed response through and calls `done` once it is read or closed.
+
+    A streamed request keeps its server busy until the last event, not just
+    until the response starts, so the bookkeeping waits for the stream.
+    """
+
+    def __init__(self, response, done: Callable):
+        self.response = response
+        self.done = done
+        self.finished = False
+
+    def _finish(self, error: Exception = None):
+        if not self.finished:
+            self.finished = True
+            self.done(error)
+
+    def __iter__(self):
+        try:
+            for event in self.response:
+                yield event
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+    def close(self):
+        self.response.close()
+        self._finish()
+
+
+class AsyncTrackedStream(TrackedStream):
+    async def __aiter__(self):
+        try:
+            async for event in self.response:
+                yield event
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+    async def close(self):
+        await self.response.close()
+        self._finish()
+
+
+class Endpoint:
+    """One inference server and the requests it is working on."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str = "not-needed",
+        client=None,
+        async_client=None,
+    ):
+        self.base_url = base_url
+        # The pool retries on another server, so the clients don't retry themselves
+        self.client = client or OpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+        self.async_client = async_client or AsyncOpenAI(
+            base_url=base_url, api_key=api_key, max_retries=0
+        )
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0  # Consecutive failed requests
+        self.completed = 0
+
+    def probe(self, timeout: float) -> bool:
+        """Whether the server answers a model listing within `timeout` seconds."""
+        health = llm_health.probe(self.client, ttl=0, timeout=timeout)
+        if not health.healthy:
+            logger.debug(f"Health check of {self.base_url} failed: {health.error}")
+        return health.healthy
+
+
+class ClientPool:
+    """Routes chat completions to the least busy healthy server of a pool.
+
+    Exposes chat.completions.create and parse and beta.chat.completions.parse,
+    as async methods on the view returned by asynchronous(). Both views share
+    the servers and their outstanding request counts.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Union[str, Endpoint]],
+        api_key: str = "not-needed",
+        failure_threshold: int = 2,
+        health_check_interval: float = 10.0,
+        probe_timeout: float = 2.0,
+    ):
+        self.endpoints: List[Endpoint] = [
+            e if isinstance(e, Endpoint) else Endpoint(e, api_key) for e in endpoints
+        ]
+        if not self.endpoints:
+            raise ValueError("A client pool needs at least one server")
+        self.failure_threshold = failure_threshold  # Failed requests before draining
+        self.health_check_interval = health_check_interval
+        self.probe_timeout = probe_timeout
+        self.lock = threading.Lock()
+        # Breaks ties between equally busy servers so idle ones share the load
+        self.rotation = itertools.count()
+        self.stopped = threading.Event()
+        self.checker = None
+        self.origin = self  # The pool views were made from, which owns the checker
+        self._bind(asynchronous=False)
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def _bind(self, asynchronous: bool):
+        call = self._call_async if asynchronous else self._call
+        completions = SimpleNamespace(
+            **{name: self._forward(call, name) for name in OPERATIONS}
+        )
+        self.chat = SimpleNamespace(completions=completions)
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    @staticmethod
+    def _forward(call: Callable, operation: str) -> Callable:
+        return lambda **kwargs: call(operation, **kwargs)
+
+    def asynchronous(self) -> "ClientPool":
+        """A view of the pool with async methods, for use in place of `async_client`."""
+        view = copy.copy(self)  # Shares the endpoints, lock and stop event
+        view._bind(asynchronous=True)
+        return view
+
+    # Routing
+
+    def _acquire(self, tried: List[Endpoint]) -> Union[Endpoint, None]:
+        """Pick the healthy server with the fewest requests outstanding."""
+        self._start_health_checks()
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in tried]
+            # With every server drained, try them anyway rather than fail outright
+            healthy = [e for e in candidates if e.healthy] or candidates
+            if not healthy:
+                return None
+            offset = next(self.rotation)
+            endpoint = min(
+                (healthy[(offset + i) % len(healthy)] for i in range(len(healthy))),
+                key=lambda e: e.outstanding,
+            )
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint: Endpoint, error: Exception = None):
+        with self.lock:
+            endpoint.outstanding -= 1
+            if error is None:
+                endpoint.failures = 0
+                endpoint.completed += 1
+            elif isinstance(error, ENDPOINT_ERRORS):
+                endpoint.failures += 1
+                if endpoint.healthy and endpoint.failures >= self.failure_threshold:
+                    endpoint.healthy = False
+                    logger.warning(
+                        f"Draining {endpoint.base_url} after {endpoint.failures} failed requests"
+                    )
+
+    def _call(self, operation: str, **kwargs):
+        tried = []
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise last_error
+            try:
+                result = OPERATIONS[operation](endpoint.client)(**kwargs)
+            except ENDPOINT_ERRORS as e:
+                self._release(endpoint, e)
+                logger.warning(f"Request to {endpoint.base_url} failed: {str(e)}")
+                tried.append(endpoint)
+                last_error = e
+                continue
+            except BaseException as e:
+                self._release(endpoint, e)
+                raise
+            if kwargs.get("stream"):
+                return TrackedStream(result, partial(self._release, endpoint))
+            self._release(endpoint)
+            return result
+
+    async def _call_async(self, operation: str, **kwargs):
+        tried = []
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise last_error
+            try:
+                result = await OPERATIONS[operation](endpoint.async_client)(**kwargs)
+            except ENDPOINT_ERRORS as e:
+                self._release(endpoint, e)
+                logger.warning(f"Request to {endpoint.base_url} failed: {str(e)}")
+                tried.append(endpoint)
+                last_error = e
+                continue
+            except BaseException as e:
+                self._release(endpoint, e)
+                raise
+            if kwargs.get("stream"):
+                return AsyncTrackedStream(result, partial(self._release, endpoint))
+            self._release(endpoint)
+            return result
+
+    # Health checks
+
+    def check_health(self) -> int:
+        """Probe every server now, draining or restoring each. Returns the healthy count."""
+        for endpoint in self.endpoints:
+            healthy = endpoint.probe(self.probe_timeout)
+            with self.lock:
+                if healthy and not endpoint.healthy:
+                    logger.info(f"{endpoint.base_url} is healthy again")
+                    endpoint.failures = 0
+                elif not healthy and endpoint.healthy:
+                    logger.warning(f"Draining {endpoint.base_url}: health check failed")
+                endpoint.healthy = healthy
+        return sum(e.healthy for e in self.endpoints)
+
+    def _check_loop(self):
+        while not self.stopped.wait(self.health_check_interval):
+            self.check_health()
+
+    def _start_health_checks(self):
+        # Started on first use, and again in a forked process that lost the thread
+        pool = self.origin
+        if pool.health_check_interval and not (pool.checker and pool.checker.is_alive()):
+            with pool.lock:
+                if not (pool.checker and pool.checker.is_alive()):
+                    pool.checker = threading.Thread(
+                        target=pool._check_loop, name="client-pool-health", daemon=True
+                    )
+                    pool.checker.start()
+
+    def close(self):
+        """Stop the background health checks."""
+        self.stopped.set()
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{e.base_url} {'healthy' if e.healthy else 'drained'} "
+            f"({e.completed} requests)"
+            for e in self.endpoints
+        )
+
+
+class Backend:
+    """A model behind a client, with its limits and how fast it has been answering.
+
+    `client` and `async_client` may be OpenAI clients or ClientPools. Limits
+    come from the model's profile: at most profile.concurrency() requests in
+    flight on each server, and the profile's request and token budgets over
+    any minute.
+    """
+
+    # Latency before the first answer, from the decode time of a typical response
+    TYPICAL_OUTPUT_TOKENS = 1024
+    LATENCY_SMOOTHING = 0.3  # Weight of the newest request in the rolling latency
+
+    def __init__(
+        self,
+        model: str,
+        client,
+        async_client=None,
+        profile: ModelProfile = None,
+    ):
+        self.model = model
+        self.client = client
+        self.async_client = async_client
+        self.profile = profile or get_profile(model)
+        servers = len(client) if isinstance(client, ClientPool) else 1
+        self.max_in_flight = self.profile.concurrency() * servers
+        self.latency = (
+            min(self.profile.output_tokens, self.TYPICAL_OUTPUT_TOKENS)
+            / self.profile.tokens_per_second
+        )
+        self.in_flight = 0
+        self.sent = deque()  # (time, prompt tokens) of requests in the last minute
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.completed = 0
+        self.rate_limited = 0
+
+    def _budget_left(self, now: float, tokens: int) -> bool:
+        while self.sent and now - self.sent[0][0] >= 60:
+            self.sent.popleft()
+        if len(self.sent) >= self.profile.requests_per_minute:
+            return False
+        budget = self.profile.tokens_per_minute
+        return not budget or sum(t for _, t in self.sent) + tokens <= budget
+
+    def available(self, now: float, tokens: int) -> bool:
+        """Whether the backend can take a request of `tokens` prompt tokens now."""
+        return (
+            now >= self.cooldown_until
+            and self.in_flight < self.max_in_flight
+            and self._budget_left(now, tokens)
+        )
+
+    def expected_latency(self) -> float:
+        """Seconds until a new request would be answered, queueing behind those in flight."""
+        return self.latency * max(1.0, (self.in_flight + 1) / self.max_in_flight)
+
+
+class BackendRouter:
+    """Routes chat completions to whichever backend should answer first.
+
+    Backends are listed primary first. Among those with room for the request,
+    the one with the lowest expected latency gets it, and ties go to the
+    earlier backend. A backend rejecting a request with a 429 or failing to
+    connect cools down for `cooldown` seconds and the request spills over to
+    the next best one. The model named in each request is replaced by the
+    model of the backend it is sent to.
+
+    Callers that have tokenized the prompt pass its count as `prompt_tokens`,
+    which is charged to the backend's token budget and not sent on.
+    """
+
+    def __init__(self, backends: Sequence[Backend], cooldown: float = 10.0):
+        self.backends = list(backends)
+        if not self.backends:
+            raise ValueError("A backend router needs at least one backend")
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self._bind(asynchronous=False)
+
+    def _bind(self, asynchronous: bool):
+        call = self._call_async if asynchronous else self._call
+        completions = SimpleNamespace(
+            **{name: ClientPool._forward(call, name) for name in OPERATIONS}
+        )
+        self.chat = SimpleNamespace(completions=completions)
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    def asynchronous(self) -> "BackendRouter":
+        """A view of the router with async methods, for use in place of `async_client`."""
+        view = copy.copy(self)
+        view._bind(asynchronous=True)
+        return view
+
+    @property
+    def profile(self) -> ModelProfile:
+        """The profile of the backend taking the smallest requests, which every backend can serve."""
+        return min((b.profile for b in self.backends), key=lambda p: p.input_tokens())
+
+    def concurrency(self) -> int:
+        """Requests worth keeping in flight across all backends."""
+        return sum(b.max_in_flight for b in self.backends)
+
+    def requests_per_minute(self) -> int:
+        return sum(b.profile.requests_per_minute for b in self.backends)
+
+    @staticmethod
+    def _prompt_tokens(messages: List[Dict]) -> int:
+        # Without a count from the caller, close enough for budgeting
+        return sum(len(str(m.get("content", ""))) for m in messages) // 4
+
+    def _choose(self, tried: List[Backend], tokens: int) -> Optional[Backend]:
+        """Pick the backend expected to answer first and count the request against it."""
+        now = time.monotonic()
+        with self.lock:
+            untried = [b for b in self.backends if b not in tried]
+            candidates = [b for b in untried if b.available(now, tokens)]
+            if not candidates:
+                # Everything is busy: queue on the best backend not cooling down
+                candidates = [b for b in untried if now >= b.cooldown_until] or untried
+            if not candidates:
+                return None
+            backend = min(candidates, key=lambda b: b.expected_latency())
+            backend.in_flight += 1
+            backend.requests += 1
+            backend.sent.append((now, tokens))
+            return backend
+
+    @staticmethod
+    def _spills_over(error: Exception) -> bool:
+        """Whether a failed request should be tried on another backend."""
+        return is_rate_limited(error) or isinstance(error, ENDPOINT_ERRORS)
+
+    def _finish(self, backend: Backend, started: float, error: Exception = None):
+        with self.lock:
+            backend.in_flight -= 1
+            if error is None:
+                latency = time.monotonic() - started
+                # The first answer replaces the estimate from the profile
+                weight = backend.LATENCY_SMOOTHING if backend.completed else 1.0
+                backend.latency += weight * (latency - backend.latency)
+                backend.completed += 1
+            elif self._spills_over(error):
+                backend.rate_limited += is_rate_limited(error)
+                backend.cooldown_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    f"Backend {backend.model} cooling down for {self.cooldown}s: {str(error)}"
+                )
+
+    def _call(self, operation: str, prompt_tokens: int = None, **kwargs):
+        tokens = prompt_tokens or self._prompt_tokens(kwargs.get("messages", []))
+        tried = []
+        while True:
+            backend = self._choose(tried, tokens)
+            if backend is None:
+                raise last_error
+            started = time.monotonic()
+            try:
+                result = OPERATIONS[operation](backend.client)(
+                    **{**kwargs, "model": backend.model}
+                )
+            except BaseException as e:
+                self._finish(backend, started, e)
+                if not self._spills_over(e):
+                    raise
+                tried.append(backend)
+                last_error = e
+                continue
+            if kwargs.get("stream"):
+                return TrackedStream(result, partial(self._finish, backend, started))
+            self._finish(backend, started)
+            return result
+
+    async def _call_async(self, operation: str, prompt_tokens: int = None, **kwargs):
+        tokens = prompt_tokens or self._prompt_tokens(kwargs.get("messages", []))
+        tried = []
+        while True:
+            backend = self._choose(tried, tokens)
+            if backend is None:
+                raise last_error
+            started = time.monotonic()
+            try:
+                result = await OPERATIONS[operation](backend.async_client)(
+                    **{**kwargs, "model": backend.model}
+                )
+            except BaseException as e:
+                self._finish(backend, started, e)
+                if not self._spills_over(e):
+                    raise
+                tried.append(backend)
+                last_error = e
+                continue
+            if kwargs.get("stream"):
+                return AsyncTrackedStream(result, partial(self._finish, backend, started))
+            self._finish(backend, started)
+            return result
+
+    def summary(self) -> str:
+        backends = ", ".join(
+            f"{b.model} {b.completed} requests at {b.latency:.2f}s"
+            + (f", {b.rate_limited} rejected with 429" if b.rate_limited else "")
+            for b in self.backends
+        )
+        spillovers = sum(b.requests for b in self.backends[1:])
+        return f"{backends}; {spillovers} spilled over from {self.backends[0].model}"
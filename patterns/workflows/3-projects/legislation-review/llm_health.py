@@ -0,0 +1,132 @@
+"""
+Cheap health checks and warm-up for OpenAI-compatible servers.
+
+probe() lists the server's models at /v1/models instead of sending a chat
+completion, so checking a cold local server doesn't make it load the model.
+Results are cached per server for a TTL, so scripts and pools can check as
+often as they like. warm_connections() opens keep-alive connections before
+the first requests need them, warm_connections_async() does the same for an
+AsyncOpenAI client, and warm_up() sends one tiny completion in the
+background so the model loads while the document is read and tokenized.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+HEALTH_TTL = 30.0  # Seconds a probe result is reused
+PROBE_TIMEOUT = 2.0
+
+
+class ServerHealth(NamedTuple):
+    """The outcome of one probe of a server."""
+
+    healthy: bool
+    models: List[str]  # Models the server lists, which may be loaded on demand
+    checked_at: float  # time.monotonic() of the probe
+    error: Optional[str] = None
+
+
+_cache: Dict[str, ServerHealth] = {}
+_lock = threading.Lock()
+
+
+def _server_key(client) -> str:
+    return str(getattr(client, "base_url", id(client)))
+
+
+def probe(client, ttl: float = HEALTH_TTL, timeout: float = PROBE_TIMEOUT) -> ServerHealth:
+    """List the server's models, reusing a result younger than `ttl` seconds."""
+    key = _server_key(client)
+    with _lock:
+        cached = _cache.get(key)
+    if cached and time.monotonic() - cached.checked_at < ttl:
+        return cached
+
+    try:
+        listing = client.models.list(timeout=timeout)
+        health = ServerHealth(
+            healthy=True,
+            models=[m.id for m in listing.data],
+            checked_at=time.monotonic(),
+        )
+    except Exception as e:
+        health = ServerHealth(
+            healthy=False, models=[], checked_at=time.monotonic(), error=str(e)
+        )
+    with _lock:
+        _cache[key] = health
+    return health
+
+
+def check_model(client, model: str, ttl: float = HEALTH_TTL) -> bool:
+    """Whether the server is up, warning if it doesn't list `model`."""
+    health = probe(client, ttl)
+    if not health.healthy:
+        logger.error(f"LLM server not available: {health.error}")
+        return False
+    if health.models and model not in health.models:
+        logger.warning(
+            f"The server doesn't list {model}, requests may fail "
+            f"(available: {', '.join(health.models)})"
+        )
+    return True
+
+
+def warm_connections(client, count: int, timeout: float = PROBE_TIMEOUT) -> int:
+    """Open up to `count` keep-alive connections in the client's pool.
+
+    Probes are sent concurrently so each takes its own connection, which the
+    pool keeps open for the requests that follow. Returns how many succeeded.
+    """
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        results = list(
+            executor.map(lambda _: probe(client, ttl=0, timeout=timeout), range(count))
+        )
+    return sum(health.healthy for health in results)
+
+
+async def warm_connections_async(
+    async_client, count: int, timeout: float = PROBE_TIMEOUT
+) -> int:
+    """Async variant of warm_connections.
+
+    An async client's connections belong to the event loop they were opened
+    on, so await this on the loop that sends the requests.
+    """
+
+    async def open_connection() -> bool:
+        try:
+            await async_client.models.list(timeout=timeout)
+            return True
+        except Exception as e:
+            logger.debug(f"Warming a connection failed: {str(e)}")
+            return False
+
+    return sum(await asyncio.gather(*(open_connection() for _ in range(count))))
+
+
+def warm_up(client, model: str) -> threading.Thread:
+    """Send a one-token completion from a background thread, so the model is loaded
+    by the time the first real request arrives. Returns the thread."""
+
+    def send():
+        started = time.monotonic()
+        try:
+            client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": "ok"}],
+                max_tokens=1,
+            )
+            logger.info(f"Warmed up {model} in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            logger.warning(f"Warm-up request to {model} failed: {str(e)}")
+
+    thread = threading.Thread(target=send, name="llm-warm-up", daemon=True)
+    thread.start()
+    return thread
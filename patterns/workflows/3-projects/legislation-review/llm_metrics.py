@@ -0,0 +1,151 @@
+"""
+Counters, gauges and histograms of an LLM pipeline run.
+
+Metrics is a thread-safe registry keyed by metric name and labels. The
+rate limiter, the client calls and the orchestrator all record into the
+process-wide `metrics` instance, which can be saved as JSON at the end of a
+run or scraped over HTTP while it goes on.
+"""
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import accumulate
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms for a run.
+
+    Values are keyed by metric name and labels. snapshot() returns them as a
+    JSON-friendly dict and prometheus() in the Prometheus text format; serve()
+    exposes both over HTTP at /metrics and /metrics.json.
+    """
+
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Dict] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Add to a counter."""
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def add(self, name: str, value: float, **labels):
+        """Move a gauge up or down."""
+        key = self._key(name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one value in a histogram."""
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                key, {"buckets": [0] * len(self.LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+            )
+            histogram["sum"] += value
+            histogram["count"] += 1
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+
+    @staticmethod
+    def _series(key: tuple, suffix: str = "", extra: Dict = None) -> str:
+        name, labels = key
+        labels = list(labels) + list((extra or {}).items())
+        if not labels:
+            return name + suffix
+        rendered = ",".join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{suffix}{{{rendered}}}"
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            histograms = {}
+            for key, histogram in self.histograms.items():
+                cumulative = list(accumulate(histogram["buckets"]))
+                histograms[self._series(key)] = {
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "buckets": {
+                        str(bound): count
+                        for bound, count in zip(self.LATENCY_BUCKETS, cumulative)
+                    },
+                }
+            return {
+                "counters": {self._series(k): v for k, v in self.counters.items()},
+                "gauges": {self._series(k): v for k, v in self.gauges.items()},
+                "histograms": histograms,
+            }
+
+    def prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for kind, values in [("counter", self.counters), ("gauge", self.gauges)]:
+                for name in sorted({key[0] for key in values}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in values.items():
+                        if key[0] == name:
+                            lines.append(f"{self._series(key)} {value}")
+            for name in sorted({key[0] for key in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in self.histograms.items():
+                    if key[0] != name:
+                        continue
+                    cumulative = accumulate(histogram["buckets"])
+                    for bound, count in zip(self.LATENCY_BUCKETS, cumulative):
+                        lines.append(
+                            f"{self._series(key, '_bucket', {'le': bound})} {count}"
+                        )
+                    lines.append(
+                        f"{self._series(key, '_bucket', {'le': '+Inf'})} {histogram['count']}"
+                    )
+                    lines.append(f"{self._series(key, '_sum')} {histogram['sum']}")
+                    lines.append(f"{self._series(key, '_count')} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve /metrics and /metrics.json from a background thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the run's log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+# Metrics of the rate limiters, client calls and orchestrator in this process
+metrics = Metrics()
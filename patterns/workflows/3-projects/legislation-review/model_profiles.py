@@ -0,0 +1,122 @@
+"""
+Profiles of the models the legislation reviewers run on.
+
+Each profile records the model's context window, the room kept for its
+response, the rate limits it is served under and how fast it decodes. The
+reviewers derive chunk size, truncation and concurrency from the profile of
+the model they are configured with instead of hard-coding them.
+"""
+
+import logging
+import math
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+
+class ModelProfile(BaseModel):
+    """Limits and throughput of one model as it is served."""
+
+    name: str = Field(description="Model name as passed to the API.")
+    context_window: int = Field(
+        description="Tokens of prompt and response the model accepts in one request."
+    )
+    output_tokens: int = Field(
+        description="Tokens kept free in the context window for the response."
+    )
+    requests_per_minute: int = Field(description="Requests allowed per minute.")
+    tokens_per_minute: Optional[int] = Field(
+        default=None,
+        description="Prompt and response tokens allowed per minute, or None if there is no token budget.",
+    )
+    parallel_requests: Optional[int] = Field(
+        default=None,
+        description="Requests the server decodes at once, or None for hosted APIs.",
+    )
+    tokens_per_second: float = Field(
+        description="Decode speed of a single request, used to estimate request latency."
+    )
+
+    def input_tokens(self, prompt_tokens: int = 0) -> int:
+        """Most document tokens one request can carry next to `prompt_tokens` of prompt.
+
+        Bounded by the context window less the response, and by the token
+        budget less the response, since a request larger than a minute's
+        budget never goes out and one that fills it leaves no room for the
+        tokens it generates.
+        """
+        limit = self.context_window - self.output_tokens
+        if self.tokens_per_minute:
+            limit = min(limit, self.tokens_per_minute - self.output_tokens)
+        return limit - prompt_tokens
+
+    def concurrency(self, maximum: int = 64) -> int:
+        """Requests worth keeping in flight.
+
+        Enough to spend the request budget while each request decodes a full
+        response, but no more than the server decodes at once.
+        """
+        latency = self.output_tokens / self.tokens_per_second
+        in_flight = math.ceil(self.requests_per_minute * latency / 60)
+        if self.parallel_requests:
+            in_flight = min(in_flight, self.parallel_requests)
+        return max(1, min(in_flight, maximum))
+
+
+# Local models are served by LM Studio with an 8K context and 4 parallel slots.
+# The request limit only keeps the local server from being flooded. gpt-4o
+# limits are those of usage tier 1. Decode speeds are rough figures, measure
+# them on your own hardware.
+MODEL_PROFILES: Dict[str, ModelProfile] = {
+    profile.name: profile
+    for profile in [
+        ModelProfile(
+            name="gemma-3-4b-it-qat",
+            context_window=8192,
+            output_tokens=2048,
+            requests_per_minute=50,
+            parallel_requests=4,
+            tokens_per_second=40,
+        ),
+        ModelProfile(
+            name="deepseek-r1-distill-llama-8b",
+            context_window=8192,
+            # Reasoning tokens come out of the same budget as the answer
+            output_tokens=3072,
+            requests_per_minute=50,
+            parallel_requests=4,
+            tokens_per_second=25,
+        ),
+        ModelProfile(
+            name="gpt-4o",
+            context_window=128000,
+            output_tokens=16384,
+            requests_per_minute=500,
+            tokens_per_minute=30000,
+            tokens_per_second=80,
+        ),
+    ]
+}
+
+# Conservative limits for models without a profile
+DEFAULT_PROFILE = ModelProfile(
+    name="default",
+    context_window=8192,
+    output_tokens=2048,
+    requests_per_minute=50,
+    parallel_requests=1,
+    tokens_per_second=20,
+)
+
+
+def get_profile(model_name: str) -> ModelProfile:
+    """Look up the profile of a model, falling back to conservative defaults."""
+    profile = MODEL_PROFILES.get(model_name)
+    if profile is None:
+        logger.warning(
+            f"No profile for model {model_name}, assuming an 8K context local model"
+        )
+        return DEFAULT_PROFILE.model_copy(update={"name": model_name})
+    return profile
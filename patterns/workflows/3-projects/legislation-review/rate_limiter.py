@@ -0,0 +1,379 @@
+"""
+Rate limiting and adaptive concurrency for requests to an LLM API.
+
+RateLimiter keeps requests within a per-minute request and token budget,
+retrying 429s with exponential backoff. ConcurrencyController optionally
+caps the requests in flight, finding the limit a server can take from its
+429s and latency (AIMD). Both work from threads and from asyncio.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Dict
+
+from llm_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an API error is a 429 rate limit rejection."""
+    return (
+        "429" in str(error)
+        or "RateLimitError" in str(error)
+        or type(error).__name__ == "RateLimitError"
+    )
+
+
+class ConcurrencyController:
+    """Adaptive (AIMD) limit on the number of requests in flight.
+
+    The limit grows by about one request per round trip while latency stays
+    near its baseline, and is multiplied by `backoff` when a request is
+    rejected with a 429 or the smoothed latency spikes. Only requests started
+    after the last cut can trigger another one, so one congestion event cuts
+    the limit once.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        window: int = 50,
+    ):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance  # Spike = smoothed latency / baseline
+        self.latencies = deque(maxlen=window)  # Recent latencies, the minimum is the baseline
+        self.smoothed_latency = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.decreases = 0
+        self.last_decrease = 0.0
+        self.history = [(time.monotonic(), self.limit)]  # (time, limit) at each change
+        self.condition = threading.Condition()
+        self.async_waiters = deque()
+
+    def _set_limit(self, limit: float):
+        previous = int(self.limit)
+        self.limit = min(max(limit, self.minimum), self.maximum)
+        if int(self.limit) != previous:
+            self.history.append((time.monotonic(), self.limit))
+            if int(self.limit) > previous:
+                self._wake()
+
+    def _wake(self):
+        """Wake blocked threads and coroutines to re-check the limit."""
+        self.condition.notify_all()
+        while self.async_waiters:
+            waiter = self.async_waiters.popleft()
+            waiter.get_loop().call_soon_threadsafe(
+                lambda w=waiter: w.done() or w.set_result(None)
+            )
+
+    def _decrease(self, started: float, reason: str):
+        if started < self.last_decrease:
+            return  # Sent under the old limit, that congestion was already handled
+        self.last_decrease = time.monotonic()
+        self.decreases += 1
+        self.smoothed_latency = None
+        self._set_limit(self.limit * self.backoff)
+        logger.warning(f"{reason}, cutting concurrency to {int(self.limit)}")
+
+    def record_success(self, started: float, latency: float):
+        """Feed the latency of a successful request into the controller."""
+        with self.condition:
+            baseline = min(self.latencies) if self.latencies else None
+            self.latencies.append(latency)
+            if self.smoothed_latency is None:
+                self.smoothed_latency = latency
+            else:
+                self.smoothed_latency = 0.8 * self.smoothed_latency + 0.2 * latency
+
+            if baseline and self.smoothed_latency > self.latency_tolerance * baseline:
+                self._decrease(
+                    started,
+                    f"Latency spike ({self.smoothed_latency:.2f}s vs {baseline:.2f}s baseline)",
+                )
+            else:
+                self._set_limit(self.limit + 1 / self.limit)
+
+    def record_rate_limited(self, started: float):
+        """Feed a 429 rejection into the controller."""
+        with self.condition:
+            self._decrease(started, "Rate limited by the server")
+
+    def _take_slot(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self._take_slot()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.limit):
+                    self._take_slot()
+                    return
+                waiter = loop.create_future()
+                self.async_waiters.append(waiter)
+            await waiter
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self._wake()
+
+    def _record_outcome(self, started: float, error: Exception = None):
+        if error is None:
+            self.record_success(started, time.monotonic() - started)
+        elif is_rate_limit_error(error):
+            self.record_rate_limited(started)
+
+    @contextmanager
+    def slot(self):
+        """Hold an in-flight slot for one request and record how it went."""
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._record_outcome(started, e)
+            raise
+        else:
+            self._record_outcome(started)
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """Async variant of slot."""
+        await self.acquire_async()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._record_outcome(started, e)
+            raise
+        else:
+            self._record_outcome(started)
+        finally:
+            self.release()
+
+    def summary(self) -> Dict:
+        """Report the limit the controller settled on.
+
+        The settled limit is the time-weighted mean over the second half of
+        the run, which ignores the initial ramp-up.
+        """
+        with self.condition:
+            now = time.monotonic()
+            start = self.history[0][0]
+            halfway = start + (now - start) / 2
+            weighted = elapsed = 0.0
+            ends = [t for t, _ in self.history[1:]] + [now]
+            for (changed, limit), until in zip(self.history, ends):
+                span = until - max(changed, halfway)
+                if span > 0:
+                    weighted += int(limit) * span
+                    elapsed += span
+            return {
+                "limit": int(self.limit),
+                "settled_limit": round(weighted / elapsed, 1)
+                if elapsed
+                else int(self.limit),
+                "peak_in_flight": self.peak_in_flight,
+                "decreases": self.decreases,
+                "baseline_latency": round(min(self.latencies), 3)
+                if self.latencies
+                else None,
+            }
+
+
+class RateLimiter:
+    """Thread-safe token-bucket rate limiter for API requests.
+
+    One bucket holds request slots and refills at requests_per_minute, the
+    other holds tokens and refills at tokens_per_minute. A caller reserves its
+    cost under the lock before sleeping, so concurrent workers queue behind
+    each other instead of all waking up and bursting past the limit together.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 50,
+        max_retries: int = 5,
+        tokens_per_minute: int = None,
+        controller: ConcurrencyController = None,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.controller = controller  # Optional adaptive in-flight limit
+        self.max_retries = max_retries
+        self.retry_intervals = [2, 4, 8, 16, 32]  # exponential backoff in seconds
+        self.lock = threading.Lock()
+        self.request_allowance = float(requests_per_minute)
+        self.token_allowance = float(tokens_per_minute or 0)
+        self.last_refill = time.monotonic()
+
+    def _refill(self):
+        """Top up both buckets for the time elapsed since the last refill."""
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.request_allowance = min(
+            self.requests_per_minute,
+            self.request_allowance + elapsed * self.requests_per_minute / 60,
+        )
+        if self.tokens_per_minute:
+            self.token_allowance = min(
+                self.tokens_per_minute,
+                self.token_allowance + elapsed * self.tokens_per_minute / 60,
+            )
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request and `tokens` from the buckets, returning the wait until they are paid for."""
+        with self.lock:
+            self._refill()
+            self.request_allowance -= 1
+            wait_time = -self.request_allowance * 60 / self.requests_per_minute
+            if self.tokens_per_minute:
+                # A request larger than the whole bucket goes through once it is full
+                self.token_allowance -= min(tokens, self.tokens_per_minute)
+                wait_time = max(
+                    wait_time, -self.token_allowance * 60 / self.tokens_per_minute
+                )
+            return max(wait_time, 0.0)
+
+    def charge(self, tokens: int):
+        """Charge tokens that were only known after the response, e.g. completion tokens."""
+        if not self.tokens_per_minute or not tokens:
+            return
+        with self.lock:
+            self._refill()
+            self.token_allowance -= tokens
+
+    def _drain(self):
+        """Empty both buckets after a 429, so every worker backs off, not just the rejected one."""
+        with self.lock:
+            self._refill()
+            self.request_allowance = min(self.request_allowance, 0.0)
+            self.token_allowance = min(self.token_allowance, 0.0)
+
+    def _charge_usage(self, result):
+        usage = getattr(result, "usage", None)
+        if usage is not None:
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            metrics.inc("llm_prompt_tokens_total", getattr(usage, "prompt_tokens", 0) or 0)
+            metrics.inc("llm_completion_tokens_total", completion_tokens)
+            self.charge(completion_tokens)
+
+    @contextmanager
+    def _track_request(self):
+        """Count a request in flight and record its latency and outcome."""
+        metrics.add("llm_requests_in_flight", 1)
+        started = time.monotonic()
+        outcome = "success"
+        try:
+            yield
+        except Exception as e:
+            outcome = "rate_limited" if is_rate_limit_error(e) else "error"
+            raise
+        finally:
+            metrics.add("llm_requests_in_flight", -1)
+            metrics.observe(
+                "llm_request_duration_seconds", time.monotonic() - started, outcome=outcome
+            )
+            metrics.inc("llm_requests_total", outcome=outcome)
+
+    def _slot(self):
+        """In-flight slot from the concurrency controller, if there is one."""
+        return self.controller.slot() if self.controller else nullcontext()
+
+    def _slot_async(self):
+        return self.controller.slot_async() if self.controller else nullcontext()
+
+    def wait_if_needed(self, tokens: int = 0):
+        """Reserve a request slot and `tokens`, sleeping until the reservation is paid."""
+        wait_time = self._reserve(tokens)
+        metrics.observe("rate_limiter_wait_seconds", wait_time)
+        if wait_time > 0:
+            logger.info(f"Rate limit reached. Waiting {wait_time:.2f} seconds...")
+            time.sleep(wait_time)
+
+    async def wait_if_needed_async(self, tokens: int = 0):
+        """Async variant of wait_if_needed that yields to the event loop."""
+        wait_time = self._reserve(tokens)
+        metrics.observe("rate_limiter_wait_seconds", wait_time)
+        if wait_time > 0:
+            logger.info(f"Rate limit reached. Waiting {wait_time:.2f} seconds...")
+            await asyncio.sleep(wait_time)
+
+    def make_request_with_retry(
+        self, request_func, *args, token_cost: int = 0, **kwargs
+    ):
+        """Make a request with retry logic and rate limiting."""
+        for retry in range(self.max_retries):
+            try:
+                self.wait_if_needed(token_cost)
+                with self._slot(), self._track_request():
+                    result = request_func(*args, **kwargs)
+                self._charge_usage(result)
+                return result
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    metrics.inc("llm_retries_total", reason="rate_limited")
+                    self._drain()
+                    wait_time = self.retry_intervals[
+                        min(retry, len(self.retry_intervals) - 1)
+                    ]
+                    logger.warning(
+                        f"Rate limit exceeded. Retrying in {wait_time} seconds... (Attempt {retry + 1}/{self.max_retries})"
+                    )
+                    time.sleep(wait_time)
+                    continue
+                raise
+        metrics.inc("llm_retries_exhausted_total")
+        raise Exception(f"Failed after {self.max_retries} retries")
+
+    async def make_request_with_retry_async(
+        self, request_func, *args, token_cost: int = 0, **kwargs
+    ):
+        """Await a request coroutine with retry logic and rate limiting."""
+        for retry in range(self.max_retries):
+            try:
+                await self.wait_if_needed_async(token_cost)
+                async with self._slot_async():
+                    with self._track_request():
+                        result = await request_func(*args, **kwargs)
+                self._charge_usage(result)
+                return result
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    metrics.inc("llm_retries_total", reason="rate_limited")
+                    self._drain()
+                    wait_time = self.retry_intervals[
+                        min(retry, len(self.retry_intervals) - 1)
+                    ]
+                    logger.warning(
+                        f"Rate limit exceeded. Retrying in {wait_time} seconds... (Attempt {retry + 1}/{self.max_retries})"
+                    )
+                    await asyncio.sleep(wait_time)
+                    continue
+                raise
+        metrics.inc("llm_retries_exhausted_total")
+        raise Exception(f"Failed after {self.max_retries} retries")
@@ -0,0 +1,213 @@
+"""
+Incremental parsing of streamed structured-output responses.
+
+SectionStream reads a JSON response as it is generated and hands back each
+object of one of its list fields as soon as the object closes, so results
+can be used long before the response is complete. It also spots runaway
+generations. json_schema_format() and sections_first() build the
+response_format of such a request.
+"""
+
+import logging
+import typing
+from typing import Dict, List, NamedTuple, Optional
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class SectionStream:
+    """Parses the sections of a streamed structured response as they arrive.
+
+    The sections are the objects of the response model's `field` list, such
+    as Legislation.sections. feed() takes each piece of the JSON as it is
+    generated and returns the sections whose objects closed in it, so they
+    can be merged long before the response is complete. It also watches for
+    runaway generations that make no progress: the same section generated
+    over and over, the same short stretch of text looping, or a long run of
+    whitespace between tokens. Length alone is left to the server's
+    max_tokens, since a long bill can legitimately need the whole response
+    budget.
+    """
+
+    MAX_REPEATED_SECTIONS = 3
+    MAX_WHITESPACE_RUN = 512
+    LOOP_WINDOW = 512  # Trailing characters checked for a loop
+    MAX_LOOP_PERIOD = 64  # Longest repeating stretch counted as a loop
+
+    def __init__(self, response_model: type[BaseModel], field: str = "sections"):
+        self.response_model = response_model
+        self.field = field
+        # The model of the list's items, e.g. LegislationSection
+        (self.section_model,) = typing.get_args(
+            response_model.model_fields[field].annotation
+        )
+        self.parts: List[str] = []
+        self.length = 0
+        self.tail = ""  # The last LOOP_WINDOW characters
+        self.loop_checked_at = 0
+        self.looped = False
+        self.depth = 0  # Nesting of objects and arrays
+        self.in_string = False
+        self.escaped = False
+        self.expect_key = False  # Whether the next top-level string is a key
+        self.key: Optional[List[str]] = None  # Top-level key being read
+        self.last_key = None
+        self.in_sections = False
+        self.section: Optional[List[str]] = None  # Section object being read
+        self.sections: List[BaseModel] = []
+        self.seen = set()
+        self.repeated = 0
+        self.whitespace_run = 0
+
+    def feed(self, text: str) -> List[BaseModel]:
+        """Scan the next piece of the response, returning the sections it completed."""
+        self.parts.append(text)
+        self.length += len(text)
+        self.tail = (self.tail + text)[-self.LOOP_WINDOW :]
+        completed = []
+        for char in text:
+            if self.section is not None:
+                self.section.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.key is not None:
+                        self.last_key = "".join(self.key)
+                        self.key = None
+                elif self.key is not None:
+                    self.key.append(char)
+                continue
+            if char.isspace():
+                self.whitespace_run += 1
+                continue
+            self.whitespace_run = 0
+
+            if char == '"':
+                self.in_string = True
+                if self.depth == 1 and self.expect_key:
+                    self.key = []
+            elif char in "{[":
+                self.depth += 1
+                if self.depth == 1:
+                    self.expect_key = True
+                elif self.depth == 2 and char == "[" and self.last_key == self.field:
+                    self.in_sections = True
+                elif self.depth == 3 and char == "{" and self.in_sections:
+                    self.section = [char]
+            elif char in "}]":
+                if self.depth == 3 and self.section is not None:
+                    section = self._parse_section("".join(self.section))
+                    self.section = None
+                    if section is not None:
+                        completed.append(section)
+                elif self.depth == 2:
+                    self.in_sections = False
+                self.depth -= 1
+            elif self.depth == 1:
+                if char == ",":
+                    self.expect_key = True
+                elif char == ":":
+                    self.expect_key = False
+        return completed
+
+    def _parse_section(self, text: str) -> Optional[BaseModel]:
+        try:
+            section = self.section_model.model_validate_json(text)
+        except ValueError as e:
+            logger.debug(f"Skipping a streamed section that doesn't parse: {str(e)}")
+            return None
+        key = section.model_dump_json()
+        if key in self.seen:
+            self.repeated += 1
+            return None
+        self.seen.add(key)
+        self.sections.append(section)
+        return section
+
+    def _looping(self) -> bool:
+        """Whether the tail is one short stretch repeated, checked every period's worth of text."""
+        if (
+            self.looped
+            or len(self.tail) < self.LOOP_WINDOW
+            or self.length - self.loop_checked_at < self.MAX_LOOP_PERIOD
+        ):
+            return self.looped
+        self.loop_checked_at = self.length
+        tail = self.tail
+        self.looped = any(
+            tail[period:] == tail[:-period]
+            for period in range(1, self.MAX_LOOP_PERIOD + 1)
+        )
+        return self.looped
+
+    def runaway(self) -> Optional[str]:
+        """Why the generation should be stopped, or None while it looks healthy."""
+        if self.repeated >= self.MAX_REPEATED_SECTIONS:
+            return "repetition"
+        if self.whitespace_run >= self.MAX_WHITESPACE_RUN:
+            return "whitespace"
+        if self._looping():
+            return "loop"
+        return None
+
+    def result(self) -> Optional[BaseModel]:
+        """The complete analysis, or None if the response is cut short or invalid.
+
+        Its sections are the ones streamed, without repeats, so they match
+        what feed() returned one for one.
+        """
+        try:
+            analysis = self.response_model.model_validate_json("".join(self.parts))
+        except ValueError:
+            return None
+        setattr(analysis, self.field, list(self.sections))
+        return analysis
+
+
+def json_schema_format(response_model: type[BaseModel]) -> Dict:
+    """The response_format of a structured output request sent as plain JSON.
+
+    Not strict, since the model's optional fields aren't all required.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_model.__name__,
+            "schema": response_model.model_json_schema(),
+        },
+    }
+
+
+def sections_first(response_format: Dict, field: str = "sections") -> Dict:
+    """Reorder a response format so the model generates the `field` list first.
+
+    Structured output follows the order of the schema's properties, so a
+    list that comes last, like Legislation.sections, would only start
+    streaming once everything before it is generated.
+    """
+    schema = response_format["json_schema"]["schema"]
+    properties = schema["properties"]
+    schema["properties"] = {
+        field: properties[field],
+        **{name: value for name, value in properties.items() if name != field},
+    }
+    if "required" in schema:
+        schema["required"] = [field] + [
+            name for name in schema["required"] if name != field
+        ]
+    return response_format
+
+
+class StreamedAnalysis(NamedTuple):
+    """A chunk analysis read from a stream, and why it was cut off, if it was."""
+
+    stream: SectionStream
+    usage: Optional[object]  # Token usage of the request, if the server sent it
+    aborted: Optional[str]
+    model: Optional[str]  # The model the server reported serving it
@@ -0,0 +1,448 @@
+"""
+In-process stand-in for a local OpenAI-compatible inference server.
+
+SimulatedServer has a fixed number of decode slots. Requests beyond that share
+its throughput, so latency grows with the number in flight, and requests beyond
+the queue limit are rejected with a 429. Latency follows a configurable
+distribution, can grow with the length of the response, and a share of
+requests can be rejected at random. A server taken
+down refuses connections until it is brought back up. StandInClient
+puts the OpenAI client interface the reviewers use in front of a server and
+answers with canned analyses built from the request text, streamed piece by
+piece over the request's latency if asked. A share of streamed responses can
+run away, repeating sections until the response budget is spent.
+
+Run directly, it drives the RateLimiter and ConcurrencyController of
+rate_limiter.py against the simulator and reports the concurrency level
+the controller settled on.
+
+    python simulated-llm-server.py [--capacity 8] [--requests 400]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import itertools
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from rate_limiter import ConcurrencyController, RateLimiter
+
+
+class SimulatedRateLimitError(Exception):
+    """Raised like the 429 an overloaded server returns."""
+
+    def __init__(self):
+        super().__init__("Error code: 429 - server is at capacity")
+
+
+class SimulatedConnectionError(ConnectionError):
+    """Raised like the connection error of a server that is down."""
+
+    def __init__(self):
+        super().__init__("Connection error: server is down")
+
+
+class SimulatedServer:
+    """A server with `capacity` decode slots and a bounded request queue.
+
+    `distribution` shapes the latency of a request on an idle server around
+    base_latency: "uniform" within +/- jitter, "lognormal" with jitter as the
+    log standard deviation, "exponential", or "constant". Each completion
+    token adds `token_latency` seconds to that, so longer responses take
+    longer. A share of `rate_limit_probability` of requests is rejected with a
+    429 regardless of load, and a share of `runaway_probability` of streamed
+    responses runs away.
+    """
+
+    DISTRIBUTIONS = ["uniform", "lognormal", "exponential", "constant"]
+
+    def __init__(
+        self,
+        capacity: int = 8,
+        base_latency: float = 0.2,
+        queue_limit: int = None,
+        jitter: float = 0.1,
+        seed: int = 0,
+        distribution: str = "uniform",
+        rate_limit_probability: float = 0.0,
+        runaway_probability: float = 0.0,
+        token_latency: float = 0.0,
+    ):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.queue_limit = queue_limit or 2 * capacity
+        self.jitter = jitter
+        self.distribution = distribution
+        self.rate_limit_probability = rate_limit_probability
+        self.runaway_probability = runaway_probability
+        self.token_latency = token_latency
+        self.up = True  # Set to False to refuse connections
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latencies = []
+        self.finished_at = []  # time.monotonic() of each completed request
+
+    def _noise(self) -> float:
+        if self.distribution == "uniform":
+            return 1 + self.random.uniform(-self.jitter, self.jitter)
+        if self.distribution == "lognormal":
+            return self.random.lognormvariate(0, self.jitter)
+        if self.distribution == "exponential":
+            return self.random.expovariate(1.0)
+        return 1.0
+
+    def _admit(self, completion_tokens: int = 0) -> float:
+        """Admit a request and return its latency, or reject it with a 429."""
+        with self.lock:
+            if not self.up:
+                raise SimulatedConnectionError()
+            if (
+                self.in_flight >= self.queue_limit
+                or self.random.random() < self.rate_limit_probability
+            ):
+                self.rejected += 1
+                raise SimulatedRateLimitError()
+            self.in_flight += 1
+            # Past capacity, every request in flight shares the decode slots
+            load = max(1.0, self.in_flight / self.capacity)
+            latency = (
+                (self.base_latency + self.token_latency * completion_tokens)
+                * load
+                * self._noise()
+            )
+            self.latencies.append(latency)
+            return latency
+
+    def _finish(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.finished_at.append(time.monotonic())
+
+    def complete(self, completion_tokens: int = 0) -> float:
+        latency = self._admit(completion_tokens)
+        try:
+            time.sleep(latency)
+        finally:
+            self._finish()
+        return latency
+
+    async def complete_async(self, completion_tokens: int = 0) -> float:
+        latency = self._admit(completion_tokens)
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            self._finish()
+        return latency
+
+
+SECTION_HEADING = re.compile(r"^[ \t]*SEC(?:TION)?\. (\d+[A-Za-z]*)\. +(.+)$", re.MULTILINE)
+DEFINITION = re.compile(r"the term ``([^']+)'' means")
+AMENDMENT = re.compile(r"^[ \t]*(.{0,200}?is amended.{0,80})$", re.MULTILINE)
+
+
+def canned_analysis(text: str) -> dict:
+    """A deterministic analysis of a chunk, shaped like the reviewer's response models.
+
+    Sections, definitions and amendments are picked out of the text with
+    regular expressions, so the merge sees realistic amounts of data.
+    """
+    sections = [
+        {
+            "section_number": f"SEC. {number}.",
+            "title": title.strip().rstrip("."),
+            "content": text[match.end() : match.end() + 400].strip(),
+        }
+        for match in SECTION_HEADING.finditer(text)
+        for number, title in [match.groups()]
+    ]
+    return {
+        "short_title": next(
+            (s["title"] for s in sections if s["title"].upper() == "SHORT TITLE"), ""
+        ),
+        "table_of_contents": "",
+        "findings_or_purpose": text[:200].strip(),
+        "definitions": [f"{term} means ..." for term in DEFINITION.findall(text)],
+        "amendments": [line.strip() for line in AMENDMENT.findall(text)],
+        "authorization_of_appropriations": "",
+        "effective_date": "",
+        "sections": sections,
+        "is_legislation": True,
+        "confidence_score": 0.9,
+    }
+
+
+def runaway_content(analysis: dict, max_chars: int) -> str:
+    """The JSON of a generation stuck repeating its sections, cut off at `max_chars`.
+
+    Without sections to repeat, the generation is stuck emitting whitespace.
+    """
+    sections = [json.dumps(section) for section in analysis["sections"]]
+    content = '{"sections": ['
+    if not sections:
+        return (content + " " * max_chars)[:max_chars]
+    for i in itertools.count():
+        if len(content) >= max_chars:
+            return content[:max_chars]
+        content += ("" if i == 0 else ", ") + sections[i % len(sections)]
+
+
+class SimulatedCompletion:
+    """The parts of a chat completion the reviewers read."""
+
+    def __init__(self, model: str, content: str, parsed, prompt_tokens: int):
+        completion_tokens = len(content) // 4
+        self.model = model
+        self.choices = [
+            SimpleNamespace(
+                index=0,
+                finish_reason="stop",
+                message=SimpleNamespace(role="assistant", content=content, parsed=parsed),
+            )
+        ]
+        self.usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+
+    def model_dump(self) -> dict:
+        return {
+            "object": "chat.completion",
+            "model": self.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": self.choices[0].message.content,
+                    },
+                }
+            ],
+            "usage": vars(self.usage),
+        }
+
+
+class SimulatedStream:
+    """A streamed completion: its content in small pieces spread over the
+    request's latency, then a last event with the usage.
+
+    Each piece is due at its share of the total latency, and sleeps shorter
+    than MIN_SLEEP are skipped, so the overhead of hundreds of tiny sleeps
+    doesn't add up to a stream much slower than the same response unstreamed.
+    The server slot is held until the stream is read to the end or closed.
+    """
+
+    PIECE_CHARS = 16  # About four tokens per event
+    MIN_SLEEP = 0.002
+
+    def __init__(self, server: SimulatedServer, completion: SimulatedCompletion, latency: float):
+        self.server = server
+        self.completion = completion
+        content = completion.choices[0].message.content
+        self.pieces = [
+            content[i : i + self.PIECE_CHARS]
+            for i in range(0, len(content), self.PIECE_CHARS)
+        ]
+        self.latency = latency
+        self.started = None
+        self.closed = False
+
+    def _wait(self, index: int) -> float:
+        """Seconds until piece `index` is due, or 0 if it is too soon to sleep for."""
+        if self.started is None:
+            self.started = time.monotonic()
+        due = self.started + self.latency * (index + 1) / len(self.pieces)
+        wait = due - time.monotonic()
+        return wait if wait >= self.MIN_SLEEP else 0
+
+    def _event(self, piece: str = None) -> SimpleNamespace:
+        model = self.completion.model
+        if piece is None:
+            return SimpleNamespace(model=model, choices=[], usage=self.completion.usage)
+        delta = SimpleNamespace(role="assistant", content=piece)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)],
+            usage=None,
+        )
+
+    def __iter__(self):
+        try:
+            for i, piece in enumerate(self.pieces):
+                wait = self._wait(i)
+                if wait:
+                    time.sleep(wait)
+                yield self._event(piece)
+            yield self._event()
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.server._finish()
+
+
+class SimulatedAsyncStream(SimulatedStream):
+    async def __aiter__(self):
+        try:
+            for i, piece in enumerate(self.pieces):
+                wait = self._wait(i)
+                if wait:
+                    await asyncio.sleep(wait)
+                yield self._event(piece)
+            yield self._event()
+        finally:
+            await self.close()
+
+    async def close(self):
+        SimulatedStream.close(self)
+
+
+class StandInClient:
+    """Answers chat completions like an OpenAI client, served by a SimulatedServer.
+
+    Exposes chat.completions.create and beta.chat.completions.parse, as async
+    methods if `asynchronous` is set, and models.list for health checks.
+    Responses are canned analyses of the last message, validated against the
+    requested response_format. create(stream=True) returns a stream whose
+    latency grows with the length of the response.
+    """
+
+    def __init__(self, server: SimulatedServer, asynchronous: bool = False):
+        self.server = server
+        if asynchronous:
+            completions = SimpleNamespace(
+                create=self._create_async, parse=self._parse_async
+            )
+        else:
+            completions = SimpleNamespace(create=self._create, parse=self._parse)
+        self.chat = SimpleNamespace(completions=completions)
+        self.beta = SimpleNamespace(chat=self.chat)
+        self.models = SimpleNamespace(list=self._list_models)
+
+    def _list_models(self, **kwargs) -> SimpleNamespace:
+        if not self.server.up:
+            raise SimulatedConnectionError()
+        return SimpleNamespace(data=[SimpleNamespace(id="simulated", object="model")])
+
+    @staticmethod
+    def _respond(
+        model: str,
+        messages: list,
+        response_format=None,
+        max_tokens: int = None,
+        runaway: bool = False,
+        **kwargs,
+    ):
+        text = messages[-1]["content"]
+        analysis = canned_analysis(text)
+        parsed = None
+        if runaway:
+            content = runaway_content(analysis, 4 * (max_tokens or 8192))
+        elif isinstance(response_format, type):
+            parsed = response_format.model_validate(
+                {k: v for k, v in analysis.items() if k in response_format.model_fields}
+            )
+            content = parsed.model_dump_json(exclude_none=True)
+        else:
+            # Structured output follows the order of the schema's properties
+            order = (
+                response_format["json_schema"]["schema"]["properties"]
+                if response_format
+                else analysis
+            )
+            content = json.dumps({k: analysis[k] for k in order if k in analysis})
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return SimulatedCompletion(model, content, parsed, prompt_tokens)
+
+    def _stream(self, stream_class, **kwargs) -> SimulatedStream:
+        completion = self._respond(**kwargs)
+        latency = self.server._admit(completion.usage.completion_tokens)
+        if self.server.random.random() < self.server.runaway_probability:
+            runaway = self._respond(runaway=True, **kwargs)
+            # Decoding the whole budget takes as much longer as it is longer
+            latency *= len(runaway.choices[0].message.content) / len(
+                completion.choices[0].message.content
+            )
+            completion = runaway
+        return stream_class(self.server, completion, latency)
+
+    def _create(self, stream: bool = False, **kwargs) -> SimulatedCompletion:
+        if stream:
+            return self._stream(SimulatedStream, **kwargs)
+        completion = self._respond(**kwargs)
+        self.server.complete(completion.usage.completion_tokens)
+        return completion
+
+    _parse = _create
+
+    async def _create_async(self, stream: bool = False, **kwargs) -> SimulatedCompletion:
+        if stream:
+            return self._stream(SimulatedAsyncStream, **kwargs)
+        completion = self._respond(**kwargs)
+        await self.server.complete_async(completion.usage.completion_tokens)
+        return completion
+
+    _parse_async = _create_async
+
+
+async def drive(server: SimulatedServer, requests: int, maximum: int):
+    """Send `requests` requests through an adaptive RateLimiter, at most `maximum` at a time."""
+    controller = ConcurrencyController(maximum=maximum)
+    rate_limiter = RateLimiter(
+        requests_per_minute=1_000_000, controller=controller
+    )
+    rate_limiter.retry_intervals = [0.1, 0.2, 0.4, 0.8, 1.6]
+    semaphore = asyncio.Semaphore(maximum)
+
+    async def send():
+        async with semaphore:
+            await rate_limiter.make_request_with_retry_async(server.complete_async)
+
+    started = time.monotonic()
+    await asyncio.gather(*(send() for _ in range(requests)))
+    return controller.summary(), time.monotonic() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--queue-limit", type=int, default=None)
+    parser.add_argument("--base-latency", type=float, default=0.2)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    logging.getLogger("rate_limiter").setLevel(logging.ERROR)
+
+    server = SimulatedServer(
+        capacity=args.capacity,
+        base_latency=args.base_latency,
+        queue_limit=args.queue_limit,
+    )
+    summary, elapsed = asyncio.run(
+        drive(server, args.requests, args.max_concurrency)
+    )
+
+    print(
+        f"Server: capacity {server.capacity}, queue limit {server.queue_limit}, "
+        f"{server.base_latency}s base latency"
+    )
+    print(
+        f"Completed {server.completed} requests in {elapsed:.1f}s "
+        f"({server.completed / elapsed:.1f} req/s), {server.rejected} rejected with 429"
+    )
+    print(f"Controller: {summary}")
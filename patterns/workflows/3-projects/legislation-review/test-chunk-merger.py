@@ -0,0 +1,81 @@
+"""
+Check how the chunking reviewer's ChunkMerger combines sections reported by
+overlapping chunks. No model or server is involved.
+
+    python test-chunk-merger.py
+"""
+
+import importlib.util
+import logging
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+def load_reviewer():
+    """Import the chunking reviewer script as a module."""
+    spec = importlib.util.spec_from_file_location(
+        "legislation_reviewer_chunking", HERE / "2.3-legislation-reviewer-chunking.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+reviewer = load_reviewer()
+logging.getLogger(reviewer.__name__).setLevel(logging.WARNING)
+
+DEFINITIONS_I = "In this title, the term covered entity means a provider of broadband service."
+DEFINITIONS_II = "In this title, the term eligible State means a State with an approved plan."
+GRANTS = (
+    "The Secretary shall award grants to eligible States to expand broadband "
+    "service to unserved areas, giving priority to areas with the lowest coverage."
+)
+
+
+def section(number: str, title: str, content: str):
+    return reviewer.LegislationSection(section_number=number, title=title, content=content)
+
+
+def merge(*chunks) -> list:
+    """Merge one analysis per chunk, each given as its list of sections."""
+    merger = reviewer.ChunkMerger()
+    for index, sections in enumerate(chunks):
+        merger.add(index, reviewer.empty_legislation(sections))
+    return merger.result().sections
+
+
+# Two different sections with the same number and heading, packed into one chunk
+sections = merge(
+    [
+        section("SEC. 101.", "DEFINITIONS.", DEFINITIONS_I),
+        section("SEC. 101.", "DEFINITIONS.", DEFINITIONS_II),
+    ]
+)
+assert [s.content for s in sections] == [DEFINITIONS_I, DEFINITIONS_II], sections
+
+# The same, in neighbouring chunks
+sections = merge(
+    [section("SEC. 101.", "DEFINITIONS.", DEFINITIONS_I)],
+    [section("SEC. 101.", "DEFINITIONS.", DEFINITIONS_II)],
+)
+assert [s.content for s in sections] == [DEFINITIONS_I, DEFINITIONS_II], sections
+
+# A section reported by both chunks, once cut short, keeps its complete text
+sections = merge(
+    [section("SEC. 102.", "GRANTS.", GRANTS[:90])],
+    [section("SEC. 102.", "GRANTS.", GRANTS)],
+)
+assert [s.content for s in sections] == [GRANTS], sections
+
+# A section cut off by one chunk and picked up by the overlapping next one is joined
+sections = merge(
+    [section("SEC. 102.", "GRANTS.", GRANTS[:100])],
+    [section("SEC. 102.", "", GRANTS[60:])],
+)
+assert [s.content for s in sections] == [GRANTS], sections
+assert sections[0].title == "GRANTS.", sections
+
+print("ChunkMerger checks passed")